@@ -1,4 +1,24 @@
 # -*- coding: utf-8 -*-
-from UfoDataReader.io.data import DataReader
-from UfoDataReader.util.parser import UfoXBRLParser
+import importlib
 
+# exported name -> module defining it. Modules are imported on first access,
+# so the parser does not load the reader stack (pandas_datareader,
+# requests) and the reader does not load python-xbrl.
+_EXPORTS = {
+    'DataReader': 'UfoDataReader.io.data',
+    'UfoXBRLParser': 'UfoDataReader.util.parser',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,136 @@
+# -*- coding: UTF-8 -*-
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from glob import glob
+
+_MAX_BYTES = 1024 ** 3
+
+
+class DiskCache(object):
+    """
+    Size-bounded on-disk key/value cache.
+
+    Each entry is a body file plus a small JSON file of headers. Reading an
+    entry marks it as recently used; once the bodies exceed `max_bytes` the
+    least recently used entries are removed. Several processes may share a
+    directory: entries are written to files of their own and renamed into
+    place, and the size is re-read from the directory every max_bytes / 16
+    bytes written.
+    """
+
+    def __init__(self, directory, max_bytes=_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = 0
+        # bytes written since the size was last read from the directory
+        self._unscanned = 0
+        self._scan()
+
+    def _bodies(self):
+        return glob(os.path.join(self.directory, '*.body'))
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        """
+        Return (body, headers) stored under `key`, or None.
+        """
+        path = self._path(key)
+        try:
+            with open(path + '.json', 'r', encoding='utf-8') as f:
+                headers = json.load(f)
+            with open(path + '.body', 'rb') as f:
+                body = f.read()
+            # mtime orders entries for eviction
+            os.utime(path + '.body', None)
+        except (IOError, ValueError):
+            return None
+        return body, headers
+
+    def path(self, key):
+        """
+        Return the name of the body file stored under `key`, or None. The
+        entry is marked as recently used.
+        """
+        path = self._path(key) + '.body'
+        try:
+            os.utime(path, None)
+        except IOError:
+            return None
+        return path
+
+    def _write(self, data):
+        # into a temporary file no other writer (thread or process) uses
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def set(self, key, body, headers=None):
+        """
+        Store `body` (bytes) and `headers` (dict) under `key`.
+        """
+        path = self._path(key)
+        headers = dict(headers or {}, key=key)
+
+        # write then rename so readers never see a partial entry
+        body_tmp = self._write(body)
+        try:
+            headers_tmp = self._write(json.dumps(headers).encode('utf-8'))
+        except BaseException:
+            os.remove(body_tmp)
+            raise
+        try:
+            replaced = os.path.getsize(path + '.body')
+        except OSError:
+            replaced = 0
+        os.replace(headers_tmp, path + '.json')
+        os.replace(body_tmp, path + '.body')
+
+        with self._lock:
+            self._size += len(body) - replaced
+            self._unscanned += len(body)
+            if self._size > self.max_bytes or self._unscanned > self.max_bytes // 16:
+                self._evict()
+
+    def _scan(self):
+        # (mtime, size, body file) of every entry; other processes may be
+        # adding and removing entries meanwhile
+        entries = []
+        for body_path in self._bodies():
+            try:
+                stat = os.stat(body_path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, body_path))
+        self._size = sum(size for _, size, _ in entries)
+        self._unscanned = 0
+        return entries
+
+    def _evict(self):
+        for _, size, body_path in sorted(self._scan()):
+            if self._size <= self.max_bytes:
+                break
+            self._size -= size
+            for name in (body_path, body_path[:-len('.body')] + '.json'):
+                try:
+                    os.remove(name)
+                except OSError:
+                    pass
+
+
+class HTTPCache(DiskCache):
+    """
+    On-disk cache of response bodies for UfoReader. The headers stored with
+    a feed (ETag, Last-Modified) are used to revalidate it.
+    """
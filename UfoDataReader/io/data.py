@@ -1,61 +1,444 @@
 #!/usr/local/bin python
 # -*- coding: UTF-8 -*-
+import asyncio
+import random
 import warnings
+import threading
 import requests
 import xml.etree.ElementTree as ElemTree
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pandas_datareader import data
-from pandas_datareader.base import _DailyBaseReader, _in_chunks
-from time import sleep
+from pandas_datareader.base import _DailyBaseReader
+from requests.adapters import HTTPAdapter
+from time import sleep, monotonic
+from datetime import datetime
 from dateutil import parser
-import pandas.compat as compat
 from pandas import DataFrame
 from pandas_datareader._utils import RemoteDataError, SymbolWarning
 from io import BytesIO
 from zipfile import ZipFile
+from UfoDataReader.io.cache import HTTPCache
+from UfoDataReader.io.state import SyncState
+from UfoDataReader.util import metrics
+from UfoDataReader.util.buffers import BufferReader, attach, share_file
+from UfoDataReader.util.columns import ColumnBuffer, BOOL, CATEGORY, DATETIME, FLOAT, OBJECT
 
 _SLEEP_TIME = 1.0
-_MAX_RETRY_COUNT = 2
+_MAX_BACKOFF = 60.0
+# responses worth retrying; other errors are not going to change
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+_BASE_URL = 'http://resource.ufocatch.com'
+_QUERY = '{symbol}'
+
+# fields of a filing read from a feed, in the order _iter_filings yields them
+_FILING_FIELDS = ('id', 'title', 'docid', 'url', 'updated', 'is_yuho')
+
+# columns of read() with as_frame
+_FRAME_COLUMNS = (('symbol', CATEGORY), ('id', OBJECT), ('title', OBJECT), ('docid', OBJECT),
+                  ('url', OBJECT), ('updated', DATETIME), ('is_yuho', BOOL))
+
+
+def _parse_timestamp(text):
+    """
+    Parse an Atom timestamp as a naive datetime, dropping the UTC offset.
+    ufocatch writes them as 2017-06-23T15:00:00+09:00, which is read by
+    slicing; anything else is left to dateutil.
+    """
+    if len(text) >= 19 and text[4] == '-' and text[7] == '-' and text[10] == 'T' \
+            and text[13] == ':' and text[16] == ':' and text[19:20] in ('', '+', '-', 'Z'):
+        try:
+            return datetime(int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                            int(text[11:13]), int(text[14:16]), int(text[17:19]))
+        except ValueError:
+            pass
+    return parser.parse(text, ignoretz=True)
+
+
+class _RateLimiter(object):
+    """
+    Thread-safe token bucket allowing `rate` requests per second on average
+    and bursts of up to `burst` requests. rate=None disables limiting.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        # take a token and return 0, or return the seconds until one is free
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        if not self.rate:
+            return
+
+        wait = self._reserve()
+        while wait:
+            sleep(wait)
+            wait = self._reserve()
+
+    async def acquire_async(self):
+        if not self.rate:
+            return
+
+        wait = self._reserve()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self._reserve()
+
+
+class CircuitOpenError(IOError):
+    """Raised instead of sending a request while the host's circuit is open"""
+
+
+class _CircuitBreaker(object):
+    """
+    Thread-safe breaker that fails requests at once after `threshold`
+    consecutive failed requests to the host. After `reset_after` seconds
+    requests are let through again; the first failure then reopens it.
+    threshold=None disables it.
+    """
+
+    def __init__(self, threshold, reset_after):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened = None
+        self._lock = threading.Lock()
+
+    def check(self):
+        if not self.threshold:
+            return
+
+        with self._lock:
+            if self._opened is None:
+                return
+            if monotonic() - self._opened < self.reset_after:
+                raise CircuitOpenError('%d consecutive requests failed, not retrying for %.0f seconds'
+                                       % (self._failures, self.reset_after - (monotonic() - self._opened)))
+            # half open: one more failure opens it again
+            self._opened = None
+            self._failures = self.threshold - 1
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened = None
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.threshold and self._failures >= self.threshold and self._opened is None:
+                self._opened = monotonic()
+                metrics.incr('reader.circuit.opened')
 
 
 class UfoReader(_DailyBaseReader):
+    """
+    max_workers : number of feeds / ZIPs downloaded concurrently
+    rate_limit : requests per second across all workers (None for no limit)
+    base_url : ufocatch server, e.g. a local stand-in for testing
+    cache : HTTPCache or directory name. Feeds are revalidated with
+        ETag/Last-Modified, ZIPs are cached for good by docid.
+    sync_state : SyncState or JSON file name. Only filings not read on an
+        earlier run are returned (and downloaded); feed parsing stops at the
+        first filing already seen.
+    parse_xbrl : parse the XBRL straight from the downloaded ZIP, without
+        writing it to disk, and add its 'dei' and 'gaap' objects to each
+        result. Implies fetch_xbrl.
+    query : ufocatch query path of a symbol's feed, '{symbol}' by default.
+        A narrower query lets the server filter the feed.
+    as_frame : read() returns one DataFrame with a row per filing of every
+        symbol (categorical `symbol`, datetime64 `updated`, bool `is_yuho`)
+        instead of a dict of lists of dicts. Filings are written straight
+        into typed columns; with fetch_xbrl an `xbrl_filename` column is
+        added, with parse_xbrl a categorical column per DEI attribute and
+        a float64 column per GAAP attribute.
+    timeout : seconds to wait for the server on each request
+    retry_count, pause : connection errors, timeouts and 429/5xx responses
+        are retried `retry_count` times, after exponential backoff from
+        `pause` seconds with random jitter
+    circuit_threshold, circuit_reset : after `circuit_threshold`
+        consecutive failed requests no more are sent for `circuit_reset`
+        seconds; symbols fail at once with CircuitOpenError meanwhile
+        (None to disable)
+
+    A symbol that cannot be read does not stop the others: its error
+    message is kept in `failures` (and with sync_state recorded, so a run
+    can be restarted on sync_state.failed()) and its result is None.
+
+    Feeds are parsed entry by entry, newest first, and reading stops at the
+    first entry older than `start`. Pages linked with rel="next" are
+    followed until then.
+    """
     _namespace = '{http://www.w3.org/2005/Atom}'
 
-    def __init__(self, symbols=None, start=None, end=None, fetch_xbrl=False, **kwargs):
+    def __init__(self, symbols=None, start=None, end=None, fetch_xbrl=False,
+                 max_workers=1, rate_limit=1.0 / _SLEEP_TIME, base_url=_BASE_URL, cache=None,
+                 sync_state=None, parse_xbrl=False, query=_QUERY, as_frame=False, timeout=30,
+                 circuit_threshold=10, circuit_reset=60.0, **kwargs):
         super(UfoReader, self).__init__(symbols=symbols,
                                         start=start,
                                         end=end,
                                         **kwargs)
-        self.fetch_xbrl = fetch_xbrl
+        self.timeout = timeout
+        self.fetch_xbrl = fetch_xbrl or parse_xbrl
+        self.parse_xbrl = parse_xbrl
+        self.max_workers = max_workers
+        self.base_url = base_url.rstrip('/')
+        self.query = query
+        self.as_frame = as_frame
+        self._rate_limiter = _RateLimiter(rate_limit, burst=max_workers)
+        self._breaker = _CircuitBreaker(circuit_threshold, circuit_reset)
+        self.failures = {}
+
+        if isinstance(cache, str):
+            cache = HTTPCache(cache)
+        self.cache = cache
+
+        if isinstance(sync_state, str):
+            sync_state = SyncState(sync_state)
+        self.sync_state = sync_state
+
+        # keep-alive connections shared by all workers: the symbol workers
+        # and, with fetch_xbrl, as many ZIP workers
+        if kwargs.get('session') is None:
+            adapter = HTTPAdapter(pool_connections=1,
+                                  pool_maxsize=2 * max_workers if self.fetch_xbrl else max_workers)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+
+        self._zip_executor = ThreadPoolExecutor(max_workers=max_workers) if self.fetch_xbrl else None
+
+    def close(self):
+        """Close network session and ZIP workers"""
+        if self._zip_executor is not None:
+            self._zip_executor.shutdown()
+        super(UfoReader, self).close()
 
     @property
     def url(self):
-        return 'http://resource.ufocatch.com/atom/edinetx/query/{symbol}'
+        return self.base_url + '/atom/edinetx/query/' + self.query
+
+    def _backoff(self, attempt):
+        # half of the delay is random, so workers that failed together
+        # do not all retry together
+        delay = min(self.pause * 2 ** attempt, _MAX_BACKOFF)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _get(self, url, headers=None):
+        for attempt in range(self.retry_count + 1):
+            self._breaker.check()
+            self._rate_limiter.acquire()
+            try:
+                with metrics.timer('reader.http'):
+                    r = self.session.get(url, headers=headers, timeout=self.timeout)
+                    metrics.incr('reader.http.requests')
+                    metrics.incr('reader.http.bytes', len(r.content))
+                if r.status_code in _RETRY_STATUS:
+                    r.raise_for_status()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError):
+                self._breaker.failure()
+                if attempt == self.retry_count:
+                    raise
+                metrics.incr('reader.http.retries')
+                sleep(self._backoff(attempt))
+                continue
+
+            # the host answered; a 4xx is about this URL only
+            self._breaker.success()
+            r.raise_for_status()
+            return r
+
+    def _cache_get(self, key):
+        return self.cache.get(key) if self.cache is not None else None
+
+    def _cache_set(self, key, body, headers=None):
+        if self.cache is not None:
+            self.cache.set(key, body, headers)
+
+    @staticmethod
+    def _validators(cached):
+        # conditional request headers for a cached feed
+        headers = {}
+        if cached is not None:
+            if cached[1].get('etag'):
+                headers['If-None-Match'] = cached[1]['etag']
+            if cached[1].get('last_modified'):
+                headers['If-Modified-Since'] = cached[1]['last_modified']
+        return headers
+
+    def _get_feed(self, url):
+        cached = self._cache_get(url)
+        r = self._get(url, headers=self._validators(cached))
+        if cached is not None and r.status_code == 304:
+            metrics.incr('reader.cache.not_modified')
+            return cached[0]
+        self._cache_set(url, r.content, {'etag': r.headers.get('ETag'),
+                                         'last_modified': r.headers.get('Last-Modified')})
+        return r.content
 
     def _get_params(self, symbol):
         return {'symbol': symbol}
 
     def read(self):
         """ read data """
-        # If a single symbol
-        if isinstance(self.symbols, (compat.string_types, int)):
-            d = self._read_one_data(self.url, params=self._get_params(self.symbols))
-        # Or multiple symbols
-        elif isinstance(self.symbols, DataFrame):
-            d = self._dl_mult_symbols(self.symbols.index)
-        else:
-            d = self._dl_mult_symbols(self.symbols)
-        return d
+        self.failures = {}
+        try:
+            # If a single symbol
+            if isinstance(self.symbols, (str, int)):
+                results = self._read_symbol(self.symbols)
+                return self._to_frame([(self.symbols, results)]) if self.as_frame else results
+            # Or multiple symbols
+            elif isinstance(self.symbols, DataFrame):
+                symbols = self.symbols.index
+            else:
+                symbols = self.symbols
+
+            stocks = self._dl_mult_symbols(symbols)
+            if self.as_frame:
+                return self._to_frame((sym, stocks.get(sym)) for sym in symbols)
+            return stocks
+        finally:
+            self._save_sync_state()
+
+    def _read_symbol(self, symbol):
+        try:
+            return self._read_one_data(self.url, params=self._get_params(symbol))
+        except Exception as e:
+            self._record_failure(symbol, e)
+            raise
+
+    def _record_failure(self, symbol, error):
+        message = '%s: %s' % (type(error).__name__, error)
+        self.failures[symbol] = message
+        metrics.incr('reader.symbol.failures')
+        if self.sync_state is not None:
+            self.sync_state.fail(symbol, message)
+
+    def _save_sync_state(self):
+        if self.sync_state is not None:
+            self.sync_state.save()
+
+    async def read_async(self, concurrency=10, limit_per_host=None):
+        """
+        read data without blocking the event loop (requires aiohttp).
+        At most `concurrency` requests are in flight, `limit_per_host` per
+        host, and with fetch_xbrl at most `concurrency` ZIPs are held at
+        once, each extracted as soon as it arrives; failed requests are retried `retry_count` times with
+        exponential backoff starting at `pause` seconds.
+        """
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError('read_async requires aiohttp')
+
+        self.failures = {}
+        # at most `concurrency` ZIPs are downloaded or waiting to be extracted
+        zip_slots = asyncio.Semaphore(concurrency)
+        connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=limit_per_host or 0)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        try:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+                # If a single symbol
+                if isinstance(self.symbols, (str, int)):
+                    try:
+                        results = await self._read_one_data_async(session, self._get_params(self.symbols),
+                                                            zip_slots)
+                    except Exception as e:
+                        self._record_failure(self.symbols, e)
+                        raise
+                    return self._to_frame([(self.symbols, results)]) if self.as_frame else results
+
+                # Or multiple symbols
+                if isinstance(self.symbols, DataFrame):
+                    symbols = list(self.symbols.index)
+                else:
+                    symbols = list(self.symbols)
+
+                results = await asyncio.gather(*[self._read_one_data_async(session, self._get_params(sym), zip_slots)
+                                                 for sym in symbols],
+                                               return_exceptions=True)
+
+            # failures are recorded before the state is saved
+            stocks = {}
+            failed = []
+            for sym, result in zip(symbols, results):
+                if isinstance(result, Exception):
+                    self._record_failure(sym, result)
+                    msg = 'Failed to read symbol: {0!r}, replacing with NaN.'
+                    warnings.warn(msg.format(sym), SymbolWarning)
+                    failed.append(sym)
+                    stocks[sym] = None
+                else:
+                    stocks[sym] = result
+        finally:
+            self._save_sync_state()
+
+        if len(failed) == len(symbols):
+            msg = "No data fetched using {0!r}"
+            raise RemoteDataError(msg.format(self.__class__.__name__))
+        if self.as_frame:
+            return self._to_frame(stocks.items())
+        return stocks
+
+    def _to_frame(self, stocks):
+        """
+        Write the (symbol, results) pairs into typed columns and return them
+        as one DataFrame. Failed symbols (results None) have no rows.
+        """
+        buffer = ColumnBuffer(_FRAME_COLUMNS)
+        if self.fetch_xbrl:
+            buffer.add_column('xbrl_filename', OBJECT)
+
+        for symbol, results in stocks:
+            if not results:
+                continue
+            if isinstance(results[0], tuple):
+                columns = dict(zip(_FILING_FIELDS, zip(*results)))
+            else:
+                columns = dict((name, [result.get(name) for result in results]) for name in _FILING_FIELDS)
+                columns['xbrl_filename'] = [result.get('xbrl_filename') for result in results]
+                if self.parse_xbrl:
+                    self._record_columns(buffer, columns, results, 'dei', CATEGORY)
+                    self._record_columns(buffer, columns, results, 'gaap', FLOAT)
+            columns['symbol'] = symbol
+            buffer.extend(columns, len(results))
+        return buffer.to_frame()
+
+    @staticmethod
+    def _record_columns(buffer, columns, results, key, kind):
+        # a column per attribute of the results' DEI or GAAP objects
+        records = [result.get(key) for result in results]
+        for record in records:
+            if record is not None:
+                for name in type(record).__slots__:
+                    buffer.add_column(name, kind)
+                    if name not in columns:
+                        columns[name] = [getattr(r, name, None) if r is not None else None for r in records]
 
     def _dl_mult_symbols(self, symbols):
         stocks = {}
         failed = []
         passed = []
-        for sym_group in _in_chunks(symbols, self.chunksize):
-            for sym in sym_group:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = dict((executor.submit(self._read_symbol, sym), sym) for sym in symbols)
+            for future in as_completed(futures):
+                sym = futures[future]
                 try:
-                    stocks[sym] = self._read_one_data(self.url, self._get_params(sym))
+                    stocks[sym] = future.result()
                     passed.append(sym)
-                except IOError:
+                except Exception:
                     msg = 'Failed to read symbol: {0!r}, replacing with NaN.'
                     warnings.warn(msg.format(sym), SymbolWarning)
                     failed.append(sym)
@@ -68,52 +451,256 @@ class UfoReader(_DailyBaseReader):
                 stocks[sym] = None
         return stocks
 
+    @metrics.timed('reader.read_one')
     def _read_one_data(self, url, params):
-        results = []
+        feed = self._get_feed(self.url.format(**params))
+
+        with metrics.timer('reader.feed.parse'):
+            filings = list(self._iter_filings(self._iter_pages(feed), params['symbol']))
+        results = self._results(filings)
+
+        # ZIPs download in parallel; keep the last extracted file name as before
+        if self.fetch_xbrl:
+            for job in [self._zip_executor.submit(self._fetch_xbrl, result) for result in results]:
+                filename = job.result()
+                if filename is not None:
+                    self.xbrl_filename = filename
+
+        self._update_sync_state(params['symbol'], filings)
+        return results
+
+    def _results(self, filings):
+        # filing tuples go to the frame as they are; otherwise they become
+        # result dicts, which fetch_xbrl adds to
+        if self.as_frame and not self.fetch_xbrl:
+            return filings
+        return [dict(zip(_FILING_FIELDS, filing)) for filing in filings]
+
+    def _update_sync_state(self, symbol, filings):
+        if self.sync_state is not None:
+            self.sync_state.record(symbol, [f[2] for f in filings], [f[4] for f in filings])
+
+    async def _read_one_data_async(self, session, params, zip_slots):
+        # cache reads and writes, ZIP extraction and XBRL parsing block, so
+        # they run on threads rather than on the event loop
+        body = await self._get_feed_async(session, self.url.format(**params))
+        filings = []
+        pending = self.sync_state.pending(params['symbol']) if self.sync_state is not None else None
+        while True:
+            links = []
+            entries = self._iter_entries(body, links)
+            with metrics.timer('reader.feed.parse'):
+                filings.extend(self._iter_filings(entries, params['symbol'], pending, links))
+            # an entry left over means reading stopped within this page
+            if not links or next(entries, None) is not None:
+                break
+            body = await self._get_feed_async(session, links[0])
+        results = self._results(filings)
+
+        if self.fetch_xbrl:
+            filenames = await asyncio.gather(*[self._fetch_xbrl_async(session, result, zip_slots)
+                                               for result in results])
+            for filename in filenames:
+                if filename is not None:
+                    self.xbrl_filename = filename
+
+        self._update_sync_state(params['symbol'], filings)
+        return results
 
-        # retrying _MAX_RETRY_COUNT
-        for _ in range(1, _MAX_RETRY_COUNT):
+    async def _get_feed_async(self, session, url):
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, self._cache_get, url)
+        status, headers, body = await self._get_async(session, url, self._validators(cached))
+        if cached is not None and status == 304:
+            metrics.incr('reader.cache.not_modified')
+            return cached[0]
+        await loop.run_in_executor(None, self._cache_set, url, body,
+                                   {'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')})
+        return body
+
+    async def _fetch_xbrl_async(self, session, result, zip_slots):
+        # each ZIP is extracted as soon as it is fetched and then let go
+        loop = asyncio.get_running_loop()
+        async with zip_slots:
+            content = await self._fetch_zip_async(session, result['url'], result['docid'])
+            return await loop.run_in_executor(self._zip_executor, self._extract_xbrl, content, result)
+
+    async def _fetch_zip_async(self, session, url, docid):
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, self._cache_get, 'zip:' + docid)
+        if cached is not None:
+            metrics.incr('reader.cache.zip_hits')
+            return cached[0]
+        _, _, content = await self._get_async(session, url)
+        await loop.run_in_executor(None, self._cache_set, 'zip:' + docid, content)
+        return content
+
+    async def _get_async(self, session, url, headers=None):
+        import aiohttp
+
+        for attempt in range(self.retry_count + 1):
+            self._breaker.check()
+            await self._rate_limiter.acquire_async()
             try:
-                url = self.url.format(**params)
-                tree = ElemTree.fromstring(requests.get(url).text.encode('utf-8'))
+                with metrics.timer('reader.http'):
+                    async with session.get(url, headers=headers) as response:
+                        if response.status in _RETRY_STATUS:
+                            response.raise_for_status()
+                        body = await response.read()
+                metrics.incr('reader.http.requests')
+                metrics.incr('reader.http.bytes', len(body))
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self._breaker.failure()
+                if attempt == self.retry_count:
+                    raise
+                metrics.incr('reader.http.retries')
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            self._breaker.success()
+            response.raise_for_status()
+            return response.status, response.headers, body
+
+    def _iter_entries(self, body, links):
+        """
+        Yield the entry elements of a feed document as they are parsed,
+        appending the href of any rel="next" link to `links`.
+        """
+        for _, el in ElemTree.iterparse(BytesIO(body)):
+            if el.tag == self._namespace + 'entry':
+                yield el
+                el.clear()
+            elif el.tag == self._namespace + 'link' and el.get('rel') == 'next':
+                links.append(el.get('href'))
+
+    def _iter_pages(self, body):
+        # entries of a feed and of the pages after it, fetched as needed
+        while True:
+            links = []
+            for el in self._iter_entries(body, links):
+                yield el
+            if not links:
+                return
+            body = self._get_feed(links[0])
+
+    def filings(self, url, symbol=None):
+        """
+        Yield a result dict for each filing listed in the feed at `url`
+        (and the pages after it) between start and end not read before.
+        symbol is the feed's key in the sync state.
+        """
+        for filing in self._iter_filings(self._iter_pages(self._get_feed(url)), symbol):
+            yield dict(zip(_FILING_FIELDS, filing))
+
+    def _iter_filings(self, entries, symbol=None, pending=None, next_pages=()):
+        """
+        Yield a tuple of _FILING_FIELDS for each entry between start and end
+        not read before. Pending filings (see SyncState) are looked for down
+        to start; those found outside the window or not found by then are
+        no longer waited for. A feed read page by page shares one `pending`
+        set between its pages, and passes the list `next_pages` the next
+        page's link is added to as `entries` are read.
+        """
+        seen = set()
+        last_updated = None
+        if self.sync_state is not None:
+            seen = self.sync_state.seen(symbol)
+            last_updated = self.sync_state.last_updated(symbol)
+            if pending is None:
+                pending = self.sync_state.pending(symbol)
+        if pending is None:
+            pending = set()
+
+        # entries are newest first, so everything after a seen one is old,
+        # but reading goes on past it until the pending filings are found
+        for el in entries:
+            docid = el.find(self._namespace + 'docid').text
+            updated = _parse_timestamp(el.find(self._namespace + 'updated').text)
+            if updated < self.start:
                 break
-            except requests.HTTPError:
-                sleep(_SLEEP_TIME)
-        else:
-            raise Exception
 
-        for el in tree.findall('.//' + self._namespace + 'entry'):
-            updated = el.find(self._namespace + 'updated').text
-            updated = parser.parse(updated, ignoretz=True)
+            if docid in pending:
+                pending.discard(docid)
+                if updated > self.end:
+                    self._drop_pending(symbol, [docid])
+                    continue
+            elif docid in seen or (last_updated is not None and updated < last_updated):
+                if not pending:
+                    break
+                continue
 
-            if self.start <= updated <= self.end:
+            if updated <= self.end:
                 id = el.find(self._namespace + 'id').text
                 title = el.find(self._namespace + 'title').text
-                docid = el.find(self._namespace + 'docid').text
                 url = el.find(self._namespace + 'link[@type="application/zip"]').attrib['href']
                 is_yuho = any([word in title for word in ['有価証券報告書', '四半期報告書']])
 
-                if self.fetch_xbrl:
-                    r = requests.get(url)
-                    if r.ok:
-                        z = ZipFile(BytesIO(r.content))
-                        for info in z.infolist():
-                            if is_yuho and '.xbrl' in info.filename and 'AuditDoc' not in info.filename:
-                                self.xbrl_filename = info.filename.split('/')[-1]
-                                z.extract(info.filename)
-
-                results.append(
-                    {
-                        'id': id,
-                        'title': title,
-                        'docid': docid,
-                        'url': url,
-                        'updated': updated,
-                        'is_yuho': is_yuho
-                    }
-                )
-        sleep(_SLEEP_TIME)
-        return results
+                yield id, title, docid, url, updated, is_yuho
+        else:
+            if next_pages:
+                # the rest of the feed is on the next page
+                return
+
+        # past start or at the end of the feed: the filings still pending
+        # are not listed any more
+        self._drop_pending(symbol, pending)
+
+    def _drop_pending(self, symbol, docids):
+        if self.sync_state is not None and docids:
+            self.sync_state.discard(symbol, docids)
+
+    def fetch_zip(self, result):
+        """
+        Return the ZIP of a filing (a result dict): a Handoff of its file
+        where the cache keeps one (see UfoDataReader.util.buffers),
+        otherwise its bytes. ZIPs never change for a docid, so a cached
+        copy is used as is.
+        """
+        key = 'zip:' + result['docid']
+        path = self.cache.path(key) if hasattr(self.cache, 'path') else None
+        if path is not None:
+            metrics.incr('reader.cache.zip_hits')
+            return share_file(path)
+
+        cached = self._cache_get(key)
+        if cached is not None:
+            metrics.incr('reader.cache.zip_hits')
+            return cached[0]
+
+        content = self._get(result['url']).content
+        self._cache_set(key, content)
+        return content
+
+    def _fetch_xbrl(self, result):
+        with attach(self.fetch_zip(result)) as buffer:
+            return self._extract_xbrl(buffer, result)
+
+    @metrics.timed('reader.zip.extract')
+    def _extract_xbrl(self, content, result):
+        """
+        Extract (or, with parse_xbrl, parse in memory) the XBRL in a filing's
+        ZIP (bytes or a mapped buffer, read in place), record its file name
+        on the result and return it.
+        """
+        with BufferReader(content) as f, ZipFile(f) as z:
+            for info in z.infolist():
+                if result['is_yuho'] and '.xbrl' in info.filename and 'AuditDoc' not in info.filename:
+                    result['xbrl_filename'] = info.filename.split('/')[-1]
+                    if self.parse_xbrl:
+                        with z.open(info) as member:
+                            self._parse_xbrl(member, result)
+                    else:
+                        z.extract(info.filename)
+        return result.get('xbrl_filename')
+
+    @staticmethod
+    def _parse_xbrl(file_handle, result):
+        from UfoDataReader.util.parser import UfoXBRLParser
+
+        xbrl_parser = UfoXBRLParser()
+        xbrl = xbrl_parser.parseStream(file_handle)
+        result['dei'] = xbrl_parser.parseDEI(xbrl)
+        result['gaap'] = xbrl_parser.parseGAAP(xbrl)
 
 
 def DataReader(symbols, data_source=None, start=None, end=None, **kwargs):
@@ -0,0 +1,338 @@
+# -*- coding: UTF-8 -*-
+"""
+Fetch and parse every filing in a date window.
+
+Feeds are read by one thread, ZIPs downloaded by `max_downloads` threads
+and the XBRL parsed on a pool of `max_parsers` processes. The stages are
+joined by queues of at most `queue_size` filings, so a slow stage holds
+the ones before it back and memory stays bounded however many filings
+the window holds. ZIPs reach the parser processes as a Handoff of shared
+memory (or of the cached file) rather than pickled bytes, and are read
+there in place. Results arrive as each filing is parsed:
+
+    harvester = Harvester(start='2017-06-19', end='2017-06-24')
+    for filing in harvester:
+        ...
+
+    ufo-harvest --start 2017-06-19 --end 2017-06-24 -o filings.csv
+"""
+import argparse
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from zipfile import ZipFile
+from UfoDataReader.io.data import UfoReader
+from UfoDataReader.util.batch import DEI_COLUMNS
+from UfoDataReader.util.buffers import BufferReader, attach, release, share, start_tracker
+
+# feed of every filing, newest first
+_MARKET_FEED = '/atom/edinetx'
+
+# sync state key of the market feed
+_MARKET = '*'
+
+_DONE = object()
+
+
+def parse_filing(content, backend='lxml'):
+    """
+    Parse the XBRL in a filing's ZIP in memory and return its file name,
+    DEI object and parseGAAPPeriods DataFrame. content is the ZIP as bytes
+    or a Handoff of it (see UfoDataReader.util.buffers). backend is 'lxml'
+    or 'stream'.
+    """
+    from UfoDataReader.util.parser import UfoXBRLParser
+
+    with attach(content) as buffer, BufferReader(buffer) as f, ZipFile(f) as z:
+        for info in z.infolist():
+            if '.xbrl' in info.filename and 'AuditDoc' not in info.filename:
+                parser = UfoXBRLParser(backend=backend)
+                xbrl = parser.parse(z.read(info))
+                return info.filename.split('/')[-1], parser.parseDEI(xbrl), parser.parseGAAPPeriods(xbrl)
+    raise ValueError('no XBRL document in the ZIP')
+
+
+class Harvester(object):
+    """
+    Every filing listed between `start` and `end`, deduplicated by docid.
+
+    symbols : securities codes whose feeds are read, or None for the
+        market-wide feed
+    reports_only : keep annual and quarterly reports only
+    max_downloads : ZIPs downloaded at once
+    max_parsers : parser processes (default: CPU count); 0 parses in the
+        download threads
+    queue_size : filings held between two stages
+    backend : parser backend, 'lxml' or 'stream'
+
+    Other keyword arguments (rate_limit, base_url, cache, sync_state, ...)
+    configure the UfoReader used for HTTP. With sync_state, filings read on
+    an earlier run are skipped, filings that failed are retried on the next
+    run, feeds that fail are recorded as failed (and not advanced) and the
+    state is saved when a run finishes.
+
+    Each filing is a UfoReader result dict plus 'xbrl_filename', 'dei',
+    'gaap' (the parseGAAPPeriods DataFrame) and 'error', a message if the
+    filing could not be downloaded or parsed. Feeds that fail are recorded
+    in `errors` (feed URL -> message).
+    """
+
+    def __init__(self, start, end, symbols=None, reports_only=True, max_downloads=4,
+                 max_parsers=None, queue_size=16, backend='lxml', **kwargs):
+        self.reader = UfoReader(symbols=symbols, start=start, end=end, max_workers=max_downloads, **kwargs)
+        self.symbols = symbols
+        self.reports_only = reports_only
+        self.max_downloads = max_downloads
+        self.max_parsers = max_parsers
+        self.queue_size = queue_size
+        self.backend = backend
+        self.errors = {}
+
+    def feeds(self):
+        """
+        Return (sync state key, URL) of each feed to read.
+        """
+        if self.symbols is None:
+            return [(_MARKET, self.reader.base_url + _MARKET_FEED)]
+        return [(str(s), self.reader.url.format(symbol=s)) for s in self.symbols]
+
+    def __iter__(self):
+        return self.run()
+
+    def run(self):
+        """
+        Run the pipeline and yield each filing as it is parsed. Leaving the
+        loop early stops the stages.
+        """
+        stop = threading.Event()
+        downloads = queue.Queue(self.queue_size)
+        parsed = queue.Queue(self.queue_size)
+        executor = self._executor()
+
+        downloaders = [threading.Thread(target=self._download, args=(downloads, parsed, stop, executor),
+                                        daemon=True)
+                       for _ in range(self.max_downloads)]
+        threads = [threading.Thread(target=self._enumerate, args=(downloads, stop), daemon=True)] + downloaders
+        for thread in threads:
+            thread.start()
+
+        read = {}
+        failed = {}
+        try:
+            running = self.max_downloads
+            while running:
+                item = self._get(parsed, stop, downloaders)
+                if item is _DONE:
+                    running -= 1
+                    continue
+
+                filing, job = item
+                key = filing.pop('feed')
+                try:
+                    filing['xbrl_filename'], filing['dei'], filing['gaap'] = job.result()
+                    read.setdefault(key, []).append(filing)
+                except Exception as e:
+                    if filing['error'] is None:
+                        filing['error'] = '%s: %s' % (type(e).__name__, e)
+                    failed.setdefault(key, []).append(filing['docid'])
+                yield filing
+
+            # failed filings are kept as pending, so the next run reads the
+            # feed back to them and retries them
+            self._save_sync_state(read, failed)
+        finally:
+            stop.set()
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def _executor(self):
+        if self.max_parsers == 0:
+            return None
+
+        # fork the workers now, while no other thread of the run can hold a
+        # lock they would inherit held, and after the shared memory tracker
+        # has started
+        start_tracker()
+        executor = ProcessPoolExecutor(self.max_parsers)
+        executor.submit(int).result()
+        return executor
+
+    @staticmethod
+    def _put(q, item, stop):
+        # block while the next stage is busy, unless the run is abandoned
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    @staticmethod
+    def _get(q, stop, producers=()):
+        # _DONE once the run is abandoned, or once the threads putting to
+        # the queue have all ended (normally or not) and it is empty
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if producers and not any(thread.is_alive() for thread in producers) and q.empty():
+                    break
+        return _DONE
+
+    def _enumerate(self, downloads, stop):
+        docids = set()
+        try:
+            for key, url in self.feeds():
+                try:
+                    for result in self.reader.filings(url, key):
+                        if result['docid'] in docids or (self.reports_only and not result['is_yuho']):
+                            continue
+                        docids.add(result['docid'])
+                        result['feed'] = key
+                        if not self._put(downloads, result, stop):
+                            return
+                except Exception as e:
+                    self.errors[url] = '%s: %s' % (type(e).__name__, e)
+        finally:
+            for _ in range(self.max_downloads):
+                self._put(downloads, _DONE, stop)
+
+    def _download(self, downloads, parsed, stop, executor):
+        while True:
+            result = self._get(downloads, stop)
+            if result is _DONE:
+                self._put(parsed, _DONE, stop)
+                return
+
+            result['error'] = None
+            job = Future()
+            try:
+                content = self.reader.fetch_zip(result)
+            except Exception as e:
+                result['error'] = '%s: %s' % (type(e).__name__, e)
+                job.set_exception(e)
+            else:
+                if executor is not None:
+                    try:
+                        job = self._submit(executor, content)
+                    except Exception as e:
+                        # e.g. BrokenProcessPool once a parser process has died
+                        result['error'] = '%s: %s' % (type(e).__name__, e)
+                        job.set_exception(e)
+                else:
+                    try:
+                        job.set_result(parse_filing(content, self.backend))
+                    except Exception as e:
+                        job.set_exception(e)
+
+            if not self._put(parsed, (result, job), stop):
+                return
+
+    def _submit(self, executor, content):
+        # the worker gets a Handoff; the shared memory is freed once the
+        # job is done, failed or cancelled
+        if isinstance(content, bytes):
+            content, shm = share(content)
+            try:
+                job = executor.submit(parse_filing, content, self.backend)
+            except BaseException:
+                release(shm)
+                raise
+            job.add_done_callback(lambda _: release(shm))
+            return job
+        return executor.submit(parse_filing, content, self.backend)
+
+    def _save_sync_state(self, read, failed):
+        sync_state = self.reader.sync_state
+        if sync_state is None:
+            return
+
+        # a feed that failed part-way is not advanced past the filings read
+        # from its first pages, or the next run would stop at them before
+        # reaching the pages that failed
+        for key, url in self.feeds():
+            if url in self.errors:
+                sync_state.fail(key, self.errors[url])
+                read.pop(key, None)
+        for key, filings in read.items():
+            sync_state.update(key, filings)
+        for key, docids in failed.items():
+            sync_state.defer(key, docids)
+        sync_state.save()
+
+    def close(self):
+        self.reader.close()
+
+
+def to_rows(filing):
+    """
+    Return a parsed filing's GAAP values as a DataFrame with a row per
+    period, the DEI attributes and the docid as columns.
+    """
+    frame = filing['gaap'].reset_index()
+    for column in DEI_COLUMNS:
+        frame[column] = getattr(filing['dei'], column)
+    frame['docid'] = filing['docid']
+    return frame
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Fetch and parse every filing in a date window.')
+    arg_parser.add_argument('--start', required=True)
+    arg_parser.add_argument('--end', required=True)
+    arg_parser.add_argument('--symbols', nargs='*', default=None,
+                            help='securities codes (default: every filer, from the market-wide feed)')
+    arg_parser.add_argument('--all-documents', action='store_true',
+                            help='keep every filing, not only annual and quarterly reports')
+    arg_parser.add_argument('-d', '--downloads', type=int, default=4, help='concurrent downloads')
+    arg_parser.add_argument('-p', '--processes', type=int, default=None,
+                            help='parser processes (default: CPU count)')
+    arg_parser.add_argument('--rate-limit', type=float, default=1.0, help='requests per second')
+    arg_parser.add_argument('--base-url', default=None, help='ufocatch server (default: resource.ufocatch.com)')
+    arg_parser.add_argument('--cache', default=None, help='directory to cache feeds and ZIPs in')
+    arg_parser.add_argument('--sync-state', default=None,
+                            help='JSON file of filings already read; only new ones are fetched')
+    arg_parser.add_argument('-o', '--output', default=None, help='CSV file to append rows to')
+    arg_parser.add_argument('--store', default=None, help='FundamentalsStore directory to append facts to')
+    args = arg_parser.parse_args(argv)
+
+    sinks = []
+    if args.output is not None:
+        header = [not os.path.exists(args.output)]
+
+        def write_csv(filing):
+            to_rows(filing).to_csv(args.output, mode='a', header=header[0], index=False)
+            header[0] = False
+        sinks.append(write_csv)
+    if args.store is not None:
+        from UfoDataReader.util.store import FundamentalsStore, to_facts
+
+        store = FundamentalsStore(args.store)
+        sinks.append(lambda filing: store.append(to_facts(filing['dei'], filing['gaap'], filing['docid'])))
+
+    kwargs = {'base_url': args.base_url} if args.base_url else {}
+    harvester = Harvester(args.start, args.end, args.symbols, reports_only=not args.all_documents,
+                          max_downloads=args.downloads, max_parsers=args.processes,
+                          rate_limit=args.rate_limit, cache=args.cache, sync_state=args.sync_state, **kwargs)
+    failed = 0
+    try:
+        for filing in harvester.run():
+            if filing['error'] is not None:
+                failed += 1
+                sys.stderr.write('%s: %s\n' % (filing['docid'], filing['error']))
+                continue
+            for sink in sinks:
+                sink(filing)
+    finally:
+        harvester.close()
+
+    for url, error in sorted(harvester.errors.items()):
+        sys.stderr.write('%s: %s\n' % (url, error))
+    return 1 if failed or harvester.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# -*- coding: UTF-8 -*-
+import json
+import os
+import threading
+from datetime import datetime
+
+
+class SyncState(object):
+    """
+    Per-symbol record of the newest filing read and the docids already
+    seen, kept in a JSON file so UfoReader can skip filings it has read on
+    an earlier run.
+
+    Symbols whose last read failed are recorded too, so a run can be
+    restarted on failed() alone, and so are filings that could not be
+    fetched (pending()), so the next run reads back to them. The file is saved every
+    `checkpoint_every` recorded symbols (None to save only when told), so
+    an interrupted run loses little work.
+    """
+
+    def __init__(self, path, checkpoint_every=50):
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self._changes = 0
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._symbols = json.load(f)
+        except (IOError, ValueError):
+            self._symbols = {}
+
+    def seen(self, symbol):
+        """
+        Return the set of docids already read for `symbol`.
+        """
+        return set(self._symbols.get(str(symbol), {}).get('docids', []))
+
+    def last_updated(self, symbol):
+        """
+        Return the `updated` time of the newest filing read for `symbol`, or None.
+        """
+        updated = self._symbols.get(str(symbol), {}).get('updated')
+        return datetime.strptime(updated, '%Y-%m-%dT%H:%M:%S') if updated else None
+
+    def pending(self, symbol):
+        """
+        Return the set of docids of `symbol` whose filings failed and are
+        still to be read.
+        """
+        return set(self._symbols.get(str(symbol), {}).get('pending', []))
+
+    def failed(self):
+        """
+        Return the symbols whose last read failed.
+        """
+        return sorted(symbol for symbol, state in self._symbols.items() if state.get('error'))
+
+    def update(self, symbol, results):
+        """
+        Record the filings in `results` (UfoReader result dicts) as read,
+        and `symbol` as read successfully.
+        """
+        self.record(symbol, [r['docid'] for r in results], [r['updated'] for r in results])
+
+    def record(self, symbol, docids, updated):
+        """
+        Record the filings of `docids`, updated at the times in `updated`,
+        as read, and `symbol` as read successfully.
+        """
+        with self._lock:
+            state = self._symbols.get(str(symbol))
+            if not docids and (state is None or 'error' not in state):
+                return
+
+            state = self._symbols.setdefault(str(symbol), {'updated': None, 'docids': []})
+            state.pop('error', None)
+            if docids:
+                state['docids'] = sorted(set(state['docids']) | set(docids))
+                pending = set(state.pop('pending', [])) - set(docids)
+                if pending:
+                    state['pending'] = sorted(pending)
+                newest = max(updated).strftime('%Y-%m-%dT%H:%M:%S')
+                if state['updated'] is None or newest > state['updated']:
+                    state['updated'] = newest
+            self._changes += 1
+        self._checkpoint()
+
+    def defer(self, symbol, docids):
+        """
+        Record the filings of `docids` as failed, to be read on the next run.
+        """
+        if not docids:
+            return
+
+        with self._lock:
+            state = self._symbols.setdefault(str(symbol), {'updated': None, 'docids': []})
+            state['pending'] = sorted(set(state.get('pending', [])) | set(docids))
+            self._changes += 1
+        self._checkpoint()
+
+    def discard(self, symbol, docids):
+        """
+        Stop waiting for the pending filings of `docids`, which the feed no
+        longer lists within the window.
+        """
+        with self._lock:
+            state = self._symbols.get(str(symbol))
+            if state is None or not set(docids) & set(state.get('pending', [])):
+                return
+
+            pending = set(state.pop('pending')) - set(docids)
+            if pending:
+                state['pending'] = sorted(pending)
+            self._changes += 1
+        self._checkpoint()
+
+    def fail(self, symbol, error):
+        """
+        Record that reading `symbol` failed with the message `error`.
+        """
+        with self._lock:
+            state = self._symbols.setdefault(str(symbol), {'updated': None, 'docids': []})
+            state['error'] = error
+            self._changes += 1
+        self._checkpoint()
+
+    def _checkpoint(self):
+        if self.checkpoint_every and self._changes >= self.checkpoint_every:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(self._symbols, f)
+            os.replace(self.path + '.tmp', self.path)
+            self._changes = 0
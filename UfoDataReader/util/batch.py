@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Parse many XBRL files in parallel.
+
+    python -m UfoDataReader.util.batch ./xbrl -p 8 -o fundamentals.csv
+"""
+import argparse
+import glob
+import os
+import sys
+from multiprocessing import Pool
+from pandas import concat
+from UfoDataReader.util.cache import ParseCache
+from UfoDataReader.util.columns import ColumnBuffer, CATEGORY, FLOAT
+from UfoDataReader.util.parser import BACKENDS, UfoXBRLParser
+
+# DEI attributes copied onto every row of a filing
+DEI_COLUMNS = ('edinet_code', 'trading_symbol', 'company_name',
+               'accounting_standards', 'period_type', 'current_fy_start', 'current_fy_end')
+
+# ParseCache per cache directory, one set per worker process
+_parse_caches = {}
+
+
+def expand_paths(paths):
+    """
+    Expand directories (searched recursively for *.xbrl) and glob patterns
+    into a sorted list of file names.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(glob.glob(os.path.join(path, '**', '*.xbrl'), recursive=True))
+        else:
+            found.extend(glob.glob(path, recursive=True))
+    return sorted(set(found))
+
+
+def parse_file(path, stream=False, cache=None, backend='soup'):
+    """
+    Parse one XBRL file and return its GAAP values for every period as a
+    DataFrame, with the filing's DEI attributes and file name as columns.
+    With `cache` (a directory), results are memoized in a ParseCache.
+    stream=True is the same as backend='stream'.
+    """
+    dei, frame = _parse(path, stream, cache, backend)
+    frame = frame.reset_index()
+    for column in DEI_COLUMNS:
+        frame[column] = getattr(dei, column)
+    frame['file'] = path
+    return frame
+
+
+def _parse(path, stream, cache, backend):
+    if cache is not None:
+        if cache not in _parse_caches:
+            _parse_caches[cache] = ParseCache(cache)
+        return _parse_caches[cache].parseGAAPPeriods(path)
+
+    parser = UfoXBRLParser(backend='stream' if stream else backend)
+    xbrl = parser.parse(path)
+    return parser.parseDEI(xbrl), parser.parseGAAPPeriods(xbrl)
+
+
+def _parse_one(args):
+    path, stream, cache, backend = args
+    try:
+        return path, parse_file(path, stream, cache, backend), None
+    except Exception as e:
+        return path, None, '%s: %s' % (type(e).__name__, e)
+
+
+def _parse_one_columns(args):
+    # DEI values, periods, GAAP attributes and a float64 array of the
+    # values: cheaper to send back from a worker than a DataFrame
+    path, stream, cache, backend = args
+    try:
+        dei, frame = _parse(path, stream, cache, backend)
+        return path, ([getattr(dei, column) for column in DEI_COLUMNS], list(frame.index),
+                      list(frame.columns), frame.to_numpy(dtype='float64')), None
+    except Exception as e:
+        return path, None, '%s: %s' % (type(e).__name__, e)
+
+
+def _imap(func, tasks, processes, chunksize):
+    if processes == 1:
+        for task in tasks:
+            yield func(task)
+        return
+
+    with Pool(processes) as pool:
+        for result in pool.imap_unordered(func, tasks, chunksize):
+            yield result
+
+
+def iter_parse(paths, processes=None, chunksize=8, stream=False, cache=None, backend='soup'):
+    """
+    Parse files on a process pool and yield (path, frame, error) tuples as
+    they finish. A file that fails yields frame=None and the error message
+    instead of stopping the batch. processes=1 parses in this process.
+    """
+    tasks = [(path, stream, cache, backend) for path in paths]
+    return _imap(_parse_one, tasks, processes, chunksize)
+
+
+def parse_files(paths, processes=None, chunksize=8, stream=False, cache=None, backend='soup',
+                columnar=False):
+    """
+    Parse every XBRL file under `paths` (directories, globs or file names)
+    and return (frame, errors): one DataFrame indexed by EDINET code and
+    period, and a dict of file name -> error message for failed files.
+    With columnar=True the values are written straight into typed columns
+    instead of a DataFrame per file: the DEI columns, period and file are
+    categorical, the GAAP attributes float64.
+    """
+    if columnar:
+        return _parse_files_columnar(paths, processes, chunksize, stream, cache, backend)
+
+    frames = []
+    errors = {}
+    for path, frame, error in iter_parse(expand_paths(paths), processes, chunksize, stream, cache,
+                                            backend):
+        if error is None:
+            frames.append(frame)
+        else:
+            errors[path] = error
+
+    if not frames:
+        return None, errors
+
+    frame = concat(frames, ignore_index=True, sort=False)
+    return frame.set_index(['edinet_code', 'period']).sort_index(), errors
+
+
+def _parse_files_columnar(paths, processes, chunksize, stream, cache, backend):
+    buffer = ColumnBuffer([('period', CATEGORY)] + [(column, CATEGORY) for column in DEI_COLUMNS]
+                          + [('file', CATEGORY)])
+    attrs = []
+    errors = {}
+    tasks = [(path, stream, cache, backend) for path in expand_paths(paths)]
+    for path, result, error in _imap(_parse_one_columns, tasks, processes, chunksize):
+        if error is not None:
+            errors[path] = error
+            continue
+
+        dei, periods, columns, values = result
+        for attr in columns:
+            if attr not in buffer.kinds:
+                buffer.add_column(attr, FLOAT)
+                attrs.append(attr)
+        data = dict(zip(DEI_COLUMNS, dei))
+        data.update(zip(columns, values.T))
+        data['period'] = periods
+        data['file'] = path
+        buffer.extend(data, len(periods))
+
+    if not len(buffer):
+        return None, errors
+
+    frame = buffer.to_frame(['period'] + attrs + list(DEI_COLUMNS) + ['file'])
+    return frame.set_index(['edinet_code', 'period']).sort_index(), errors
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Parse XBRL files to GAAP values.')
+    arg_parser.add_argument('paths', nargs='+', help='XBRL files, directories or glob patterns')
+    arg_parser.add_argument('-p', '--processes', type=int, default=None,
+                            help='number of worker processes (default: CPU count)')
+    arg_parser.add_argument('-c', '--chunksize', type=int, default=8,
+                            help='files handed to a worker at a time')
+    arg_parser.add_argument('--stream', action='store_true',
+                            help='use the streaming parser instead of BeautifulSoup')
+    arg_parser.add_argument('--backend', choices=BACKENDS, default='soup',
+                            help='XBRL parser backend (default: soup)')
+    arg_parser.add_argument('--cache', default=None,
+                            help='directory to memoize parse results in')
+    arg_parser.add_argument('--columnar', action='store_true',
+                            help='build the result from typed columns (categorical DEI columns)')
+    arg_parser.add_argument('-o', '--output', default=None,
+                            help='output file (.csv or .pkl); CSV to stdout by default')
+    args = arg_parser.parse_args(argv)
+
+    frame, errors = parse_files(args.paths, args.processes, args.chunksize, args.stream, args.cache,
+                                args.backend, args.columnar)
+
+    for path, error in sorted(errors.items()):
+        sys.stderr.write('%s: %s\n' % (path, error))
+
+    if frame is not None:
+        if args.output is None:
+            frame.to_csv(sys.stdout)
+        elif args.output.endswith('.pkl'):
+            frame.to_pickle(args.output)
+        else:
+            frame.to_csv(args.output)
+
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Hand filing bytes to parser processes without pickling them.
+
+The sending side puts a ZIP in shared memory (or names a file holding it)
+and sends only a small Handoff; the worker maps the same bytes and reads
+them in place:
+
+    handoff, shm = share(content)
+    job = executor.submit(work, handoff)
+    job.add_done_callback(lambda job: release(shm))
+
+    def work(handoff):
+        with attach(handoff) as buffer, BufferReader(buffer) as f:
+            ...
+"""
+import io
+import mmap
+import os
+from collections import namedtuple
+from contextlib import contextmanager
+
+# kind is 'shm' (name of a SharedMemory block) or 'file' (file name); size
+# is the number of bytes of the block or file that hold the data
+Handoff = namedtuple('Handoff', ['kind', 'name', 'size'])
+
+
+class BufferReader(io.RawIOBase):
+    """
+    Read-only, seekable binary file object over a buffer (bytes, mmap,
+    memoryview, shared memory). Reads copy only the bytes asked for, so
+    ZipFile and the parsers can work on a mapped buffer in place.
+    """
+
+    def __init__(self, buffer):
+        super(BufferReader, self).__init__()
+        self._view = memoryview(buffer).cast('B')
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._view[self._pos:self._pos + len(b)]
+        n = len(data)
+        b[:n] = data
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError('negative seek position %d' % offset)
+        self._pos = offset
+        return offset
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        # the buffer's owner cannot be closed while this view is held
+        if not self.closed:
+            self._view.release()
+        super(BufferReader, self).close()
+
+
+def start_tracker():
+    """
+    Start the process that frees shared memory left by processes that
+    exit, so processes forked afterwards use it rather than each starting
+    their own (which would free blocks still in use when they exit).
+    """
+    if os.name == 'posix':
+        from multiprocessing import resource_tracker
+
+        resource_tracker.ensure_running()
+
+
+def share(content):
+    """
+    Copy `content` (bytes) into a new shared memory block and return its
+    Handoff and the SharedMemory, to be passed to release() once the
+    receiver is done with it.
+    """
+    from multiprocessing.shared_memory import SharedMemory
+
+    shm = SharedMemory(create=True, size=max(len(content), 1))
+    shm.buf[:len(content)] = content
+    return Handoff('shm', shm.name, len(content)), shm
+
+
+def share_file(path):
+    """
+    Return a Handoff of the file `path`, mapped by the receiver.
+    """
+    return Handoff('file', path, os.path.getsize(path))
+
+
+def release(shm):
+    """
+    Free a block made by share().
+    """
+    shm.close()
+    shm.unlink()
+
+
+@contextmanager
+def attach(content):
+    """
+    Context manager giving the bytes of a Handoff as a read-only buffer,
+    mapped rather than copied. Anything else (bytes, ...) is given as is.
+    The buffer must not be used once the block exits.
+    """
+    if not isinstance(content, Handoff):
+        yield content
+        return
+
+    if content.kind == 'shm':
+        from multiprocessing.shared_memory import SharedMemory
+
+        shm = SharedMemory(content.name)
+        view = shm.buf[:content.size].toreadonly()
+        try:
+            yield view
+        finally:
+            view.release()
+            shm.close()
+    elif content.kind == 'file':
+        with open(content.name, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+    else:
+        raise ValueError('unknown handoff kind %r' % (content.kind,))
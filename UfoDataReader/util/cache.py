@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import pickle
+from io import BytesIO
+from UfoDataReader.io.cache import DiskCache
+from UfoDataReader.util.elements import DEI_ELEMENTS, GAAP_ELEMENTS
+from UfoDataReader.util.parser import UfoXBRLParser
+
+_MAX_BYTES = 256 * 1024 ** 2
+
+# changes with the element registry, so old results are not reused
+_REGISTRY_KEY = hashlib.sha1(repr((DEI_ELEMENTS, GAAP_ELEMENTS)).encode('utf-8')).hexdigest()
+
+
+class ParseCache(object):
+    """
+    Memoize parse results on disk, keyed by a hash of the XBRL bytes, the
+    requested context(s) and the element registry. A file that has already
+    been parsed is hashed and its results unpickled instead of re-parsed.
+    """
+
+    def __init__(self, directory, max_bytes=_MAX_BYTES):
+        self._store = DiskCache(directory, max_bytes)
+        self.parser = UfoXBRLParser()
+
+    def parseGAAP(self, file_handle, context=None):
+        """
+        Return (dei, gaap) as from parseDEI/parseGAAP.
+        """
+        return self._cached(file_handle, ('gaap', context),
+                            lambda xbrl: (self.parser.parseDEI(xbrl),
+                                          self.parser.parseGAAP(xbrl, context=context)))
+
+    def parseGAAPPeriods(self, file_handle, contexts=None):
+        """
+        Return (dei, frame) as from parseDEI/parseGAAPPeriods.
+        """
+        return self._cached(file_handle, ('periods', contexts and tuple(contexts)),
+                            lambda xbrl: (self.parser.parseDEI(xbrl),
+                                          self.parser.parseGAAPPeriods(xbrl, contexts=contexts)))
+
+    def _cached(self, file_handle, request, parse):
+        if hasattr(file_handle, 'read'):
+            content = file_handle.read()
+        else:
+            with open(file_handle, 'rb') as f:
+                content = f.read()
+
+        key = '%s:%r:%s' % (hashlib.sha256(content).hexdigest(), request, _REGISTRY_KEY)
+        cached = self._store.get(key)
+        if cached is not None:
+            return pickle.loads(cached[0])
+
+        result = parse(self.parser.parseStream(BytesIO(content)))
+        try:
+            self._store.set(key, pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+        except (IOError, OSError):
+            # the result is good without its cache entry
+            pass
+        return result
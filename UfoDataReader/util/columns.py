@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Typed, growable column arrays that many rows are written into before one
+DataFrame is made of them, so no per-row objects are kept around.
+
+    buffer = ColumnBuffer([('symbol', CATEGORY), ('updated', DATETIME)])
+    buffer.extend({'symbol': '7203', 'updated': [d1, d2]}, 2)
+    frame = buffer.to_frame()
+"""
+import numpy
+from datetime import datetime, timedelta
+
+# column kinds
+CATEGORY = 'category'
+DATETIME = 'datetime'
+BOOL = 'bool'
+FLOAT = 'float'
+OBJECT = 'object'
+
+_DTYPES = {
+    CATEGORY: 'int32',
+    DATETIME: 'datetime64[ns]',
+    BOOL: 'bool',
+    FLOAT: 'float64',
+    OBJECT: 'object',
+}
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_NAT = numpy.datetime64('NaT').astype('int64')
+
+# value of rows a column was not given for
+_MISSING = {
+    CATEGORY: -1,
+    DATETIME: numpy.datetime64('NaT'),
+    BOOL: False,
+    FLOAT: numpy.nan,
+    OBJECT: None,
+}
+
+
+class ColumnBuffer(object):
+    """
+    Columns of the given (name, kind) pairs, grown by doubling. Category
+    columns hold int32 codes and become pandas Categoricals with sorted
+    categories; None is a missing value.
+    """
+
+    def __init__(self, columns=(), capacity=1024):
+        self.kinds = {}
+        self._arrays = {}
+        self._categories = {}
+        self._size = 0
+        self._capacity = capacity
+        for name, kind in columns:
+            self.add_column(name, kind)
+
+    @property
+    def names(self):
+        return list(self.kinds)
+
+    def __len__(self):
+        return self._size
+
+    def add_column(self, name, kind):
+        """
+        Add a column, missing for the rows already written.
+        """
+        if name in self.kinds:
+            return
+        self.kinds[name] = kind
+        self._arrays[name] = numpy.full(self._capacity, _MISSING[kind], dtype=_DTYPES[kind])
+        if kind == CATEGORY:
+            self._categories[name] = {}
+
+    @staticmethod
+    def _nanoseconds(value):
+        # numpy converts datetime objects one by one, several times slower
+        if value is None:
+            return _NAT
+        if isinstance(value, datetime) and value.tzinfo is None:
+            return (value - _EPOCH) // _MICROSECOND * 1000
+        return numpy.datetime64(value, 'ns').astype('int64')
+
+    def _reserve(self, size):
+        if size <= self._capacity:
+            return
+
+        capacity = self._capacity
+        while capacity < size:
+            capacity *= 2
+        for name, array in self._arrays.items():
+            grown = numpy.full(capacity, _MISSING[self.kinds[name]], dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            self._arrays[name] = grown
+        self._capacity = capacity
+
+    def _code(self, name, value):
+        if value is None:
+            return -1
+        categories = self._categories[name]
+        code = categories.get(value)
+        if code is None:
+            code = categories[value] = len(categories)
+        return code
+
+    def extend(self, columns, length):
+        """
+        Append `length` rows. `columns` maps column names to a list, tuple
+        or array of `length` values or to one value for all of them;
+        columns left out are missing.
+        """
+        start = self._size
+        self._reserve(start + length)
+        for name, values in columns.items():
+            kind = self.kinds[name]
+            target = self._arrays[name][start:start + length]
+            if not isinstance(values, (list, tuple, numpy.ndarray)):
+                values = [values] * length
+            if kind == CATEGORY:
+                target[:] = [self._code(name, value) for value in values]
+            elif kind == DATETIME and not isinstance(values, numpy.ndarray):
+                target.view('int64')[:] = [self._nanoseconds(value) for value in values]
+            elif kind == OBJECT:
+                # element by element, so tuples are not taken for rows
+                for i, value in enumerate(values):
+                    target[i] = value
+            else:
+                target[:] = values
+        self._size = start + length
+
+    def _categorical(self, name):
+        from pandas import Categorical
+
+        codes = self._arrays[name][:self._size]
+        categories = list(self._categories[name])
+        try:
+            order = sorted(range(len(categories)), key=categories.__getitem__)
+        except TypeError:
+            # values that do not compare keep the order they were seen in
+            return Categorical.from_codes(codes, categories)
+
+        # the last slot maps the missing code -1 to itself
+        remap = numpy.empty(len(order) + 1, dtype='int32')
+        remap[order] = numpy.arange(len(order), dtype='int32')
+        remap[-1] = -1
+        return Categorical.from_codes(remap[codes], [categories[i] for i in order])
+
+    def to_frame(self, columns=None):
+        """
+        Return the rows written so far as a DataFrame of `columns` (all
+        columns by default). Columns other than categories are views of
+        the buffer's arrays, which pandas consolidates once.
+        """
+        from pandas import DataFrame
+
+        data = {}
+        for name in (columns if columns is not None else self.names):
+            if self.kinds[name] == CATEGORY:
+                data[name] = self._categorical(name)
+            else:
+                data[name] = self._arrays[name][:self._size]
+        return DataFrame(data, columns=list(data), copy=False)
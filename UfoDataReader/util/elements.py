@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Registry of the XBRL elements UfoXBRLParser extracts.
+
+Each entry maps a GAAP/DEI object attribute to an element name, the
+accounting standard(s) it belongs to (None for every standard), the kind of
+context it is reported in ('Instant', 'Duration', or None for DEI facts which
+are read regardless of context) and whether a consolidated lookup may fall
+back on the filer's non-consolidated fact. The lowercased lookup keys are
+computed once here, at import.
+"""
+from collections import namedtuple
+
+Element = namedtuple('Element', ['attr', 'name', 'key', 'standard', 'period', 'fallback'])
+
+JAPAN_GAAP = 'Japan GAAP'
+US_GAAP = 'US GAAP'
+IFRS = 'IFRS'
+
+INSTANT = 'Instant'
+DURATION = 'Duration'
+
+# standards whose filers report their balance in the jppfs_cor taxonomy
+_JPPFS_STANDARDS = (JAPAN_GAAP, US_GAAP)
+
+# annual report periods, newest first
+PERIODS = ('Current', 'Prior1', 'Prior2', 'Prior3', 'Prior4')
+
+# quarterly report periods: the quarter (year to date) and the same quarter
+# of the previous year
+QUARTERLY_PERIODS = ('CurrentQuarter', 'Prior1Quarter')
+
+# period -> id of the context holding its Instant / Duration facts
+CONTEXTS = dict(
+    [(p, {INSTANT: p + 'YearInstant', DURATION: p + 'YearDuration'}) for p in PERIODS] +
+    [(p + 'Quarter', {INSTANT: p + 'QuarterInstant', DURATION: p + 'YTDDuration'}) for p in ('Current', 'Prior1')]
+)
+
+# jpdei_cor:TypeOfCurrentPeriodDEI values of quarterly reports
+QUARTERLY_PERIOD_TYPES = ('Q1', 'Q2', 'Q3', 'Q4', 'HY')
+
+
+def _element(attr, name, standard=None, period=None, fallback=False):
+    return Element(attr, name, name.lower(), standard, period, fallback)
+
+
+DEI_ELEMENTS = (
+    _element('edinet_code', 'jpdei_cor:EDINETCodeDEI'),
+    _element('trading_symbol', 'jpdei_cor:SecurityCodeDei'),
+    _element('company_name', 'jpcrp_cor:CompanyNameCoverPage'),
+    _element('accounting_standards', 'jpdei_cor:AccountingStandardsDEI'),
+    _element('current_fy_start', 'jpdei_cor:CurrentFiscalYearStartDateDei'),
+    _element('current_fy_end', 'jpdei_cor:CurrentFiscalYearEndDateDei'),
+    _element('consolidated', 'jpdei_cor:WhetherConsolidatedFinancialStatementsArePreparedDEI'),
+    _element('period_type', 'jpdei_cor:TypeOfCurrentPeriodDEI'),
+    _element('current_period_end', 'jpdei_cor:CurrentPeriodEndDateDEI'),
+)
+
+GAAP_ELEMENTS = (
+    # incomes
+    _element('netsales', 'jpcrp_cor:NetSalesSummaryOfBusinessResults', JAPAN_GAAP, DURATION),
+    _element('ordinary_income_loss', 'jpcrp_cor:OrdinaryIncomeLossSummaryOfBusinessResults', JAPAN_GAAP, DURATION),
+    _element('profit_loss', 'jpcrp_cor:ProfitLossAttributableToOwnersOfParentSummaryOfBusinessResults',
+             JAPAN_GAAP, DURATION),
+    _element('comprehensive_income', 'jpcrp_cor:ComprehensiveIncomeSummaryOfBusinessResults', JAPAN_GAAP, DURATION),
+    _element('net_assets', 'jpcrp_cor:NetAssetsSummaryOfBusinessResults', JAPAN_GAAP, INSTANT),
+    _element('total_assets', 'jpcrp_cor:TotalAssetsSummaryOfBusinessResults', JAPAN_GAAP, INSTANT),
+    _element('bps', 'jpcrp_cor:NetAssetsPerShareSummaryOfBusinessResults', JAPAN_GAAP, INSTANT, fallback=True),
+    _element('dps', 'jpcrp_cor:DividendPaidPerShareSummaryOfBusinessResults', JAPAN_GAAP, DURATION, fallback=True),
+    _element('basic_eps', 'jpcrp_cor:BasicEarningsLossPerShareSummaryOfBusinessResults', JAPAN_GAAP, DURATION, fallback=True),
+    _element('diluted_eps', 'jpcrp_cor:DilutedEarningsPerShareSummaryOfBusinessResults', JAPAN_GAAP, DURATION, fallback=True),
+    _element('equity_to_asset_ratio', 'jpcrp_cor:EquityToAssetRatioSummaryOfBusinessResults', JAPAN_GAAP, INSTANT),
+    _element('roe', 'jpcrp_cor:RateOfReturnOnEquitySummaryOfBusinessResults', JAPAN_GAAP, DURATION),
+    _element('per', 'jpcrp_cor:PriceEarningsRatioSummaryOfBusinessResults', JAPAN_GAAP, DURATION),
+    _element('cf_from_operating', 'jpcrp_cor:NetCashProvidedByUsedInOperatingActivitiesSummaryOfBusinessResults',
+             JAPAN_GAAP, DURATION),
+    _element('cf_from_investing', 'jpcrp_cor:NetCashProvidedByUsedInInvestingActivitiesSummaryOfBusinessResults',
+             JAPAN_GAAP, DURATION),
+    _element('cf_from_financing', 'jpcrp_cor:NetCashProvidedByUsedInFinancingActivitiesSummaryOfBusinessResults',
+             JAPAN_GAAP, DURATION),
+
+    _element('revenues', 'jpcrp_cor:RevenuesUSGAAPSummaryOfBusinessResults', US_GAAP, DURATION),
+    _element('operating_income_loss', 'jpcrp_cor:OperatingIncomeLossUSGAAPSummaryOfBusinessResults',
+             US_GAAP, DURATION),
+    _element('profit_loss_before_tax', 'jpcrp_cor:ProfitLossBeforeTaxUSGAAPSummaryOfBusinessResults',
+             US_GAAP, DURATION),
+    _element('net_income_loss', 'jpcrp_cor:NetIncomeLossAttributableToOwnersOfParentUSGAAPSummaryOfBusinessResults',
+             US_GAAP, DURATION),
+    _element('comprehensive_income', 'jpcrp_cor:ComprehensiveIncomeUSGAAPSummaryOfBusinessResults', US_GAAP, DURATION),
+    _element('basic_eps', 'jpcrp_cor:BasicEarningsLossPerShareUSGAAPSummaryOfBusinessResults', US_GAAP, DURATION, fallback=True),
+    _element('diluted_eps', 'jpcrp_cor:DilutedEarningsLossPerShareUSGAAPSummaryOfBusinessResults', US_GAAP, DURATION, fallback=True),
+    _element('per', 'jpcrp_cor:PriceEarningsRatioUSGAAPSummaryOfBusinessResults', US_GAAP, DURATION),
+    _element('cf_from_operating', 'jpcrp_cor:CashFlowsFromUsedInOperatingActivitiesUSGAAPSummaryOfBusinessResults',
+             US_GAAP, DURATION),
+    _element('cf_from_investing', 'jpcrp_cor:CashFlowsFromUsedInInvestingActivitiesUSGAAPSummaryOfBusinessResults',
+             US_GAAP, DURATION),
+    _element('cf_from_financing', 'jpcrp_cor:CashFlowsFromUsedInFinancingActivitiesUSGAAPSummaryOfBusinessResults',
+             US_GAAP, DURATION),
+
+    _element('revenues', 'jpcrp_cor:RevenueIFRSSummaryOfBusinessResults', IFRS, DURATION),
+    _element('profit_loss_before_tax', 'jpcrp_cor:ProfitLossBeforeTaxIFRSSummaryOfBusinessResults', IFRS, DURATION),
+    _element('profit_loss', 'jpcrp_cor:ProfitLossAttributableToOwnersOfParentIFRSSummaryOfBusinessResults',
+             IFRS, DURATION),
+    _element('comprehensive_income',
+             'jpcrp_cor:ComprehensiveIncomeAttributableToOwnersOfParentIFRSSummaryOfBusinessResults', IFRS, DURATION),
+    _element('equity', 'jpcrp_cor:EquityAttributableToOwnersOfParentIFRSSummaryOfBusinessResults', IFRS, INSTANT),
+    _element('total_assets', 'jpcrp_cor:TotalAssetsIFRSSummaryOfBusinessResults', IFRS, INSTANT),
+    _element('bps', 'jpcrp_cor:EquityAttributableToOwnersOfParentPerShareIFRSSummaryOfBusinessResults',
+             IFRS, INSTANT, fallback=True),
+    _element('basic_eps', 'jpcrp_cor:BasicEarningsLossPerShareIFRSSummaryOfBusinessResults', IFRS, DURATION, fallback=True),
+    _element('diluted_eps', 'jpcrp_cor:DilutedEarningsLossPerShareIFRSSummaryOfBusinessResults', IFRS, DURATION, fallback=True),
+    _element('equity_to_asset_ratio', 'jpcrp_cor:RatioOfOwnersEquityToGrossAssetsIFRSSummaryOfBusinessResults',
+             IFRS, INSTANT),
+    _element('roe', 'jpcrp_cor:RateOfReturnOnEquityIFRSSummaryOfBusinessResults', IFRS, DURATION),
+    _element('per', 'jpcrp_cor:PriceEarningsRatioIFRSSummaryOfBusinessResults', IFRS, DURATION),
+    _element('cf_from_operating', 'jpcrp_cor:CashFlowsFromUsedInOperatingActivitiesIFRSSummaryOfBusinessResults',
+             IFRS, DURATION),
+    _element('cf_from_investing', 'jpcrp_cor:CashFlowsFromUsedInInvestingActivitiesIFRSSummaryOfBusinessResults',
+             IFRS, DURATION),
+    _element('cf_from_financing', 'jpcrp_cor:CashFlowsFromUsedInFinancingActivitiesIFRSSummaryOfBusinessResults',
+             IFRS, DURATION),
+
+    # issued shares are only reported for the filer itself
+    _element('shares_outstanding', 'jpcrp_cor:TotalNumberOfIssuedSharesSummaryOfBusinessResults',
+             period=INSTANT, fallback=True),
+
+    # balance. Entries are applied in order, so the jppfs_cor:NetAssets
+    # value overrides the Japan GAAP summary one.
+    _element('assets', 'jppfs_cor:Assets', _JPPFS_STANDARDS, INSTANT),
+    _element('current_assets', 'jppfs_cor:CurrentAssets', _JPPFS_STANDARDS, INSTANT),
+    _element('non_current_assets', 'jppfs_cor:NonCurrentAssets', _JPPFS_STANDARDS, INSTANT),
+    _element('liabilities', 'jppfs_cor:Liabilities', _JPPFS_STANDARDS, INSTANT),
+    _element('current_liabilities', 'jppfs_cor:CurrentLiabilities', _JPPFS_STANDARDS, INSTANT),
+    _element('non_current_liabilities', 'jppfs_cor:NonCurrentLiabilities', _JPPFS_STANDARDS, INSTANT),
+    _element('net_assets', 'jppfs_cor:NetAssets', _JPPFS_STANDARDS, INSTANT),
+
+    # IFRS filers report their consolidated balance in the IFRS taxonomy;
+    # their jppfs_cor facts are the non-consolidated Japan GAAP ones
+    _element('assets', 'jpigp_cor:AssetsIFRS', IFRS, INSTANT),
+    _element('current_assets', 'jpigp_cor:CurrentAssetsIFRS', IFRS, INSTANT),
+    _element('non_current_assets', 'jpigp_cor:NonCurrentAssetsIFRS', IFRS, INSTANT),
+    _element('liabilities', 'jpigp_cor:LiabilitiesIFRS', IFRS, INSTANT),
+    _element('current_liabilities', 'jpigp_cor:CurrentLiabilitiesIFRS', IFRS, INSTANT),
+    _element('non_current_liabilities', 'jpigp_cor:NonCurrentLiabilitiesIFRS', IFRS, INSTANT),
+    _element('net_assets', 'jpigp_cor:EquityIFRS', IFRS, INSTANT),
+)
+
+
+def _applies(element, standard):
+    return element.standard is None or standard in (element.standard if isinstance(element.standard, tuple)
+                                                    else (element.standard,))
+
+
+# GAAP elements per accounting standard, in registry order
+GAAP_ELEMENTS_BY_STANDARD = dict(
+    (standard, tuple(e for e in GAAP_ELEMENTS if _applies(e, standard)))
+    for standard in (JAPAN_GAAP, US_GAAP, IFRS)
+)
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in timing and counting of the reader and parser stages.
+
+Nothing is recorded until a registry is enabled:
+
+    from UfoDataReader.util import metrics
+    registry = metrics.enable()
+    ...
+    registry.export('stats.json')
+    metrics.disable()
+
+While disabled, each instrumented call costs one global lookup.
+Stage timings are histograms named after the stage (e.g. 'reader.http',
+'parser.parse', 'parser.data_processing'), in seconds; byte counts and
+cache hits are counters. Callbacks added with subscribe() see every
+event as it happens.
+"""
+import functools
+import json
+import math
+import os
+import threading
+from time import perf_counter
+
+# the enabled MetricsRegistry, or None
+registry = None
+
+
+class Histogram(object):
+    """
+    Count, sum, min and max of observed values, plus counts per power of two
+    bucket (bucket n holds values in [2**n, 2**(n+1))).
+    """
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = {}
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        bucket = math.frexp(value)[1] - 1 if value > 0 else None
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'buckets': dict(('<=0' if b is None else '2^%d' % b, n)
+                            for b, n in sorted(self.buckets.items(), key=lambda i: (i[0] is not None, i[0]))),
+        }
+
+
+class MetricsRegistry(object):
+    """
+    Thread-safe counters and histograms, with callbacks called as
+    callback(kind, name, value) for every 'counter' and 'histogram' event.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        self._callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        self._callbacks.remove(callback)
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        for callback in self._callbacks:
+            callback('counter', name, value)
+
+    def observe(self, name, value):
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(value)
+        for callback in self._callbacks:
+            callback('histogram', name, value)
+
+    def timer(self, name):
+        return _Timer(self, name)
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def snapshot(self):
+        """
+        Return the current counters and histogram summaries as a dict.
+        """
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'histograms': dict((name, h.to_dict()) for name, h in self.histograms.items()),
+            }
+
+    def export(self, path):
+        """
+        Write snapshot() to the JSON file `path`.
+        """
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2, sort_keys=True)
+        os.replace(path + '.tmp', path)
+
+
+class _Timer(object):
+    __slots__ = ('registry', 'name', 'start')
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, perf_counter() - self.start)
+
+
+class _NullTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def enable(metrics_registry=None):
+    """
+    Start recording into `metrics_registry` (a new MetricsRegistry by
+    default) and return it.
+    """
+    global registry
+    registry = metrics_registry if metrics_registry is not None else MetricsRegistry()
+    return registry
+
+
+def disable():
+    global registry
+    registry = None
+
+
+def incr(name, value=1):
+    if registry is not None:
+        registry.incr(name, value)
+
+
+def observe(name, value):
+    if registry is not None:
+        registry.observe(name, value)
+
+
+def timer(name):
+    """
+    Context manager timing its block into histogram `name`.
+    """
+    if registry is None:
+        return _NULL_TIMER
+    return registry.timer(name)
+
+
+def timed(name):
+    """
+    Decorator timing each call of the function into histogram `name`.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if registry is None:
+                return func(*args, **kwargs)
+            with registry.timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,24 +1,201 @@
 # -*- coding: utf-8 -*-
 from xbrl import XBRLParser, XBRLParserException
-import re
+import io
 import logging
+import mmap
+import xml.etree.ElementTree as ElemTree
+from collections import namedtuple
 from decimal import Decimal
+from UfoDataReader.util import metrics
+from UfoDataReader.util.buffers import BufferReader
+from UfoDataReader.util.elements import DEI_ELEMENTS, GAAP_ELEMENTS_BY_STANDARD, \
+    JAPAN_GAAP, US_GAAP, IFRS, INSTANT, DURATION, PERIODS, QUARTERLY_PERIODS, QUARTERLY_PERIOD_TYPES, CONTEXTS
+
+# taxonomies kept by the streaming parser
+_STREAM_PREFIXES = ('jpcrp_cor', 'jppfs_cor', 'jpigp_cor', 'jpdei_cor')
+
+# cover page and DEI facts are reported against the filing date
+_FILING_DATE_CONTEXT = 'FilingDateInstant'
+
+_XBRLI = '{http://www.xbrl.org/2003/instance}'
+_XBRLDI = '{http://xbrl.org/2006/xbrldi}'
+
+# dimension member marking the filer's own (non-consolidated) figures
+_NON_CONSOLIDATED_MEMBER = 'jppfs_cor:NonConsolidatedMember'
+
+# parse() backends: python-xbrl's BeautifulSoup, lxml, ElementTree iterparse
+BACKENDS = ('soup', 'lxml', 'stream')
+
+# in-memory XBRL documents parse() reads in place
+_BUFFER_TYPES = (bytes, bytearray, memoryview, mmap.mmap)
 
 
 class UfoXBRLParser(XBRLParser):
+    def __init__(self, precision=0, backend='soup'):
+        if backend not in BACKENDS:
+            raise ValueError('backend must be one of %s' % ', '.join(BACKENDS))
+        super(UfoXBRLParser, self).__init__(precision)
+        self.backend = backend
+
+    @metrics.timed('parser.parse')
     def parse(self, file_handle):
+        """
+        Parse an XBRL file with the parser's backend: 'soup' (the default)
+        returns python-xbrl's BeautifulSoup, 'lxml' and 'stream' a FactIndex
+        (see parseLxml and parseStream). parseGAAP/parseDEI give the same
+        results for each.
+
+        file_handle is a file name or, for 'lxml' and 'stream', a binary
+        file object. The document may also be given as a buffer (bytes,
+        memoryview, mmap, shared memory), which is read in place.
+        """
+        if self.backend == 'lxml':
+            return self.parseLxml(file_handle)
+
+        if isinstance(file_handle, _BUFFER_TYPES):
+            with BufferReader(file_handle) as f:
+                if self.backend == 'stream':
+                    return self.parseStream(f)
+                return super().parse(io.TextIOWrapper(f, encoding='utf-8'))
+
+        if self.backend == 'stream':
+            return self.parseStream(file_handle)
+
         with open(file_handle, 'r', encoding='utf-8') as of:
             xbrl = super().parse(of)
         return xbrl
 
+    @metrics.timed('parser.parseLxml')
+    def parseLxml(self, file_handle):
+        """
+        Parse the raw bytes of an XBRL file name, binary file object or
+        buffer with lxml and return a FactIndex of every prefixed fact,
+        usable in place of the soup by parseGAAP/parseDEI.
+        """
+        try:
+            from lxml import etree
+        except ImportError:
+            raise ImportError('the lxml backend requires lxml')
+
+        xml_parser = etree.XMLParser(huge_tree=True, remove_comments=True)
+        if isinstance(file_handle, _BUFFER_TYPES):
+            # libxml2 reads the buffer where it is
+            root = etree.fromstring(file_handle, xml_parser)
+        else:
+            root = etree.parse(file_handle, xml_parser).getroot()
+        prefixes = dict((uri, prefix) for prefix, uri in root.nsmap.items() if prefix)
+
+        index = FactIndex()
+        contexts = []
+        for elem in root.iterchildren():
+            if elem.tag == _XBRLI + 'context':
+                contexts.append(_stream_context(elem))
+                continue
+
+            contextref = elem.get('contextRef')
+            if contextref is None:
+                continue
+            uri, _, local_name = elem.tag[1:].partition('}')
+            prefix = prefixes.get(uri)
+            if prefix is not None:
+                name = (prefix + ':' + local_name).lower()
+                index.setdefault(name, []).append(Fact(name,
+                                                       contextref,
+                                                       elem.text or '',
+                                                       unitref=elem.get('unitRef'),
+                                                       decimals=elem.get('decimals')))
+        index.contexts = ContextTable(contexts)
+        return index
+
+    @metrics.timed('parser.parseStream')
+    def parseStream(self, file_handle, context=None):
+        """
+        Parse the XBRL incrementally without building a soup and return a
+        FactIndex usable in place of the soup by parseGAAP/parseDEI.
+        Only jpcrp_cor, jppfs_cor, jpigp_cor and jpdei_cor facts are kept and, when
+        `context` is given ('Current', 'Prior1', 'CurrentQuarter', ... or a
+        list of them), only those in its Instant/Duration contexts (plus the
+        filing-date facts parseDEI needs). Each element is freed as soon as it
+        has been read.
+        """
+        if context is None:
+            context_ids = None
+        else:
+            if isinstance(context, str):
+                context = [context]
+            context_ids = set()
+            for c in context:
+                context_ids.update(CONTEXTS[c].values())
+            context_ids.add(_FILING_DATE_CONTEXT)
+
+        index = FactIndex()
+        contexts = []
+        for fact in self.iter_facts(file_handle, context_ids, contexts):
+            index.setdefault(fact.name, []).append(fact)
+        index.contexts = ContextTable(contexts)
+        return index
+
+    @staticmethod
+    def iter_facts(file_handle, context_ids=None, contexts=None, prefixes=_STREAM_PREFIXES):
+        """
+        Yield Fact objects from an XBRL file name or binary file object using
+        ElementTree.iterparse. Only the root element and the current fact are
+        held in memory. If `contexts` is a list, the document's contexts are
+        appended to it as Context tuples. Only facts of the taxonomies in
+        `prefixes` are read (None for all).
+        """
+        uris = {}
+        root = None
+        depth = 0
+        for event, item in ElemTree.iterparse(file_handle, events=('start-ns', 'start', 'end')):
+            if event == 'start-ns':
+                prefix, uri = item
+                if prefix and (prefixes is None or prefix in prefixes):
+                    uris[uri] = prefix
+            elif event == 'start':
+                if root is None:
+                    root = item
+                depth += 1
+            else:
+                depth -= 1
+                if depth != 1:
+                    continue
+
+                if item.tag == _XBRLI + 'context':
+                    if contexts is not None:
+                        contexts.append(_stream_context(item))
+                    del root[:]
+                    continue
+
+                uri, _, local_name = item.tag[1:].partition('}')
+                prefix = uris.get(uri)
+                contextref = item.get('contextRef')
+                if prefix is not None and contextref is not None:
+                    if context_ids is None or not context_ids.isdisjoint(contextref.split('_')):
+                        yield Fact((prefix + ':' + local_name).lower(),
+                                   contextref,
+                                   item.text or '',
+                                   unitref=item.get('unitRef'),
+                                   decimals=item.get('decimals'))
+
+                # drop the finished fact (and any children) from the tree
+                del root[:]
+
+    @metrics.timed('parser.parseGAAP')
     def parseGAAP(self,
                   xbrl,
                   doc_date="",
-                  context="Current",
-                  ignore_errors=0):
+                  context=None,
+                  ignore_errors=0,
+                  consolidated=True):
 
         """
-        Parse Japan GAAP or US GAAP from our XBRL soup and return a GAAP object.
+        Parse Japan GAAP, US GAAP or IFRS from our XBRL soup and return a GAAP
+        object. `context` is an annual ('Current', 'Prior1', ...) or quarterly
+        ('CurrentQuarter', 'Prior1Quarter') period; by default the current
+        one of the filing's kind (see periods()). consolidated=False reads
+        the filer's own (NonConsolidatedMember) figures instead of the
+        consolidated ones.
         """
 
         if ignore_errors == 2:
@@ -29,261 +206,172 @@ class UfoXBRLParser(XBRLParser):
         else:
             logger = None
 
-        # collect all contexts up that are relevant to us
-        context_ids = []
-        if context in ('Current', 'Prior1', 'Prior2', 'Prior3', 'Prior4'):
-            context_ids = [context + 'YearInstant', context + 'YearDuration']
-
+        index = self.tag_index(xbrl)
         dei = self.parseDEI(xbrl)
-
-        # try:
-        #     for context_tag in context_tags:
-        #         # we don't want any segments
-        #         if context in context_tag.attrs['contextref']:
-        #             context_ids.append()
-        #
-        #         if context_tag.find(doc_root + "entity") is None:
-        #             continue
-        #         if context_tag.find(doc_root + "entity").find(
-        #         doc_root + "segment") is None:
-        #             context_id = context_tag.attrs['id']
-        #
-        #             found_start_date = None
-        #             found_end_date = None
-        # except IndexError:
-        #     raise XBRLParserException('problem getting contexts')
+        if context is None:
+            context = self.periods(dei)[0]
+
+        # collect all contexts up that are relevant to us, per context kind
+        # and non-consolidated fallback
+        context_ids = {}
+        if context in CONTEXTS:
+            table = self.context_table(xbrl)
+            context_ids = dict(((kind, fallback),
+                                table.context_ids(context, kind, self._scopes(dei, consolidated, fallback)))
+                               for kind in (INSTANT, DURATION) for fallback in (False, True))
 
         gaap_obj = None
+        if dei.accounting_standards in GAAP_CLASSES:
+            gaap_obj = GAAP_CLASSES[dei.accounting_standards]()
 
-        # incomes
-        if dei.accounting_standards == 'Japan GAAP':
-            gaap_obj = JapanGAAP()
-
-            netsales = \
-                xbrl.find_all(name=re.compile('jpcrp_cor:NetSalesSummaryOfBusinessResults',
-                                              re.IGNORECASE | re.MULTILINE))
-            gaap_obj.netsales = \
-                self.data_processing(netsales, xbrl, ignore_errors, logger, context_ids)
-
-            ordinary_income_loss = \
-                xbrl.find_all(name=re.compile('jpcrp_cor:OrdinaryIncomeLossSummaryOfBusinessResults',
-                                              re.IGNORECASE | re.MULTILINE))
-            gaap_obj.ordinary_income_loss = \
-                self.data_processing(ordinary_income_loss, xbrl, ignore_errors, logger, context_ids)
-
-            profit_loss = \
-                xbrl.find_all(
-                    name=re.compile('jpcrp_cor:ProfitLossAttributableToOwnersOfParentSummaryOfBusinessResults',
-                                    re.IGNORECASE | re.MULTILINE))
-            gaap_obj.profit_loss = \
-                self.data_processing(profit_loss, xbrl, ignore_errors, logger, context_ids)
-
-            comprehensive_income = \
-                xbrl.find_all(name=re.compile('jpcrp_cor:ComprehensiveIncomeSummaryOfBusinessResults',
-                                              re.IGNORECASE | re.MULTILINE))
-            gaap_obj.comprehensive_income = \
-                self.data_processing(comprehensive_income, xbrl, ignore_errors, logger, context_ids)
-
-            net_assets = \
-                xbrl.find_all(
-                    name=re.compile('jpcrp_cor:NetAssetsSummaryOfBusinessResults', re.IGNORECASE | re.MULTILINE))
-            gaap_obj.net_assets = \
-                self.data_processing(net_assets, xbrl, ignore_errors, logger, context_ids)
-
-            total_assets = \
-                xbrl.find_all(
-                    name=re.compile('jpcrp_cor:TotalAssetsSummaryOfBusinessResults', re.IGNORECASE | re.MULTILINE))
-            gaap_obj.total_assets = \
-                self.data_processing(total_assets, xbrl, ignore_errors, logger, context_ids)
-
-            bps = \
-                xbrl.find_all(name=re.compile('jpcrp_cor:NetAssetsPerShareSummaryOfBusinessResults',
-                                              re.IGNORECASE | re.MULTILINE))
-            gaap_obj.bps = \
-                self.data_processing(bps, xbrl, ignore_errors, logger, context_ids)
-
-            dps = \
-                xbrl.find_all(name=re.compile('jpcrp_cor:DividendPaidPerShareSummaryOfBusinessResults',
-                                              re.IGNORECASE | re.MULTILINE))
-            gaap_obj.dps = \
-                self.data_processing(dps, xbrl, ignore_errors, logger, context_ids)
-
-            basic_eps = \
-                xbrl.find_all(name=re.compile('jpcrp_cor:BasicEarningsLossPerShareSummaryOfBusinessResults',
-                                              re.IGNORECASE | re.MULTILINE))
-            gaap_obj.basic_eps = \
-                self.data_processing(basic_eps, xbrl, ignore_errors, logger, context_ids)
-
-            diluted_eps = \
-                xbrl.find_all(name=re.compile('jpcrp_cor:DilutedEarningsPerShareSummaryOfBusinessResults',
-                                              re.IGNORECASE | re.MULTILINE))
-            gaap_obj.diluted_eps = \
-                self.data_processing(diluted_eps, xbrl, ignore_errors, logger, context_ids)
-
-            equity_to_asset_ratio = \
-                xbrl.find_all(name=re.compile('jpcrp_cor:EquityToAssetRatioSummaryOfBusinessResults',
-                                              re.IGNORECASE | re.MULTILINE))
-            gaap_obj.equity_to_asset_ratio = \
-                self.data_processing(equity_to_asset_ratio, xbrl, ignore_errors, logger, context_ids)
-
-            roe = \
-                xbrl.find_all(name=re.compile('jpcrp_cor:RateOfReturnOnEquitySummaryOfBusinessResults',
-                                              re.IGNORECASE | re.MULTILINE))
-            gaap_obj.roe = \
-                self.data_processing(roe, xbrl, ignore_errors, logger, context_ids)
-
-            per = \
-                xbrl.find_all(name=re.compile('jpcrp_cor:PriceEarningsRatioSummaryOfBusinessResults',
-                                              re.IGNORECASE | re.MULTILINE))
-            gaap_obj.per = \
-                self.data_processing(per, xbrl, ignore_errors, logger, context_ids)
-
-            cf_from_operating = \
-                xbrl.find_all(
-                    name=re.compile('jpcrp_cor:NetCashProvidedByUsedInOperatingActivitiesSummaryOfBusinessResults',
-                                    re.IGNORECASE | re.MULTILINE))
-            gaap_obj.cf_from_operating = \
-                self.data_processing(cf_from_operating, xbrl, ignore_errors, logger, context_ids)
-
-            cf_from_investing = \
-                xbrl.find_all(
-                    name=re.compile('jpcrp_cor:NetCashProvidedByUsedInInvestingActivitiesSummaryOfBusinessResults',
-                                    re.IGNORECASE | re.MULTILINE))
-            gaap_obj.cf_from_investing = \
-                self.data_processing(cf_from_investing, xbrl, ignore_errors, logger, context_ids)
-
-            cf_from_financing = \
-                xbrl.find_all(
-                    name=re.compile('jpcrp_cor:NetCashProvidedByUsedInFinancingActivitiesSummaryOfBusinessResults',
-                                    re.IGNORECASE | re.MULTILINE))
-            gaap_obj.cf_from_financing = \
-                self.data_processing(cf_from_financing, xbrl, ignore_errors, logger, context_ids)
-
-        # incomes
-        if dei.accounting_standards == 'US GAAP':
-            gaap_obj = USGAAP()
-            revenues = \
-                xbrl.find_all(name=re.compile('jpcrp_cor:RevenuesUSGAAPSummaryOfBusinessResults',
-                                              re.IGNORECASE | re.MULTILINE))
-            gaap_obj.revenues = \
-                self.data_processing(revenues, xbrl, ignore_errors, logger, context_ids)
-
-            operating_income_loss = \
-                xbrl.find_all(name=re.compile('jpcrp_cor:OperatingIncomeLossUSGAAPSummaryOfBusinessResults',
-                                              re.IGNORECASE | re.MULTILINE))
-            gaap_obj.operating_income_loss = \
-                self.data_processing(operating_income_loss, xbrl, ignore_errors, logger, context_ids)
-
-            profit_loss_before_tax = \
-                xbrl.find_all(name=re.compile('jpcrp_cor:ProfitLossBeforeTaxUSGAAPSummaryOfBusinessResults',
-                                              re.IGNORECASE | re.MULTILINE))
-            gaap_obj.profit_loss_before_tax = \
-                self.data_processing(profit_loss_before_tax, xbrl, ignore_errors, logger, context_ids)
-
-            net_income_loss = \
-                xbrl.find_all(
-                    name=re.compile('jpcrp_cor:NetIncomeLossAttributableToOwnersOfParentUSGAAPSummaryOfBusinessResults',
-                                    re.IGNORECASE | re.MULTILINE))
-            gaap_obj.net_income_loss = \
-                self.data_processing(net_income_loss, xbrl, ignore_errors, logger, context_ids)
-
-            comprehensive_income = \
-                xbrl.find_all(name=re.compile('jpcrp_cor:ComprehensiveIncomeUSGAAPSummaryOfBusinessResults',
-                                              re.IGNORECASE | re.MULTILINE))
-            gaap_obj.comprehensive_income = \
-                self.data_processing(comprehensive_income, xbrl, ignore_errors, logger, context_ids)
-
-            basic_eps = \
-                xbrl.find_all(name=re.compile('jpcrp_cor:BasicEarningsLossPerShareUSGAAPSummaryOfBusinessResults',
-                                              re.IGNORECASE | re.MULTILINE))
-            gaap_obj.basic_eps = \
-                self.data_processing(basic_eps, xbrl, ignore_errors, logger, context_ids)
-
-            diluted_eps = \
-                xbrl.find_all(name=re.compile('jpcrp_cor:DilutedEarningsLossPerShareUSGAAPSummaryOfBusinessResults',
-                                              re.IGNORECASE | re.MULTILINE))
-            gaap_obj.diluted_eps = \
-                self.data_processing(diluted_eps, xbrl, ignore_errors, logger, context_ids)
-
-            per = \
-                xbrl.find_all(name=re.compile('jpcrp_cor:PriceEarningsRatioUSGAAPSummaryOfBusinessResults',
-                                              re.IGNORECASE | re.MULTILINE))
-            gaap_obj.per = \
-                self.data_processing(per, xbrl, ignore_errors, logger, context_ids)
-
-            cf_from_operating = \
-                xbrl.find_all(
-                    name=re.compile('jpcrp_cor:CashFlowsFromUsedInOperatingActivitiesUSGAAPSummaryOfBusinessResults',
-                                    re.IGNORECASE | re.MULTILINE))
-            gaap_obj.cf_from_operating = \
-                self.data_processing(cf_from_operating, xbrl, ignore_errors, logger, context_ids)
-
-            cf_from_investing = \
-                xbrl.find_all(
-                    name=re.compile('jpcrp_cor:CashFlowsFromUsedInInvestingActivitiesUSGAAPSummaryOfBusinessResults',
-                                    re.IGNORECASE | re.MULTILINE))
-            gaap_obj.cf_from_investing = \
-                self.data_processing(cf_from_investing, xbrl, ignore_errors, logger, context_ids)
-
-            cf_from_financing = \
-                xbrl.find_all(
-                    name=re.compile('jpcrp_cor:CashFlowsFromUsedInFinancingActivitiesUSGAAPSummaryOfBusinessResults',
-                                    re.IGNORECASE | re.MULTILINE))
-            gaap_obj.cf_from_financing = \
-                self.data_processing(cf_from_financing, xbrl, ignore_errors, logger, context_ids)
-
-        # balance
-        shares_outstanding = \
-            xbrl.find_all(name=re.compile('jpcrp_cor:TotalNumberOfIssuedSharesSummaryOfBusinessResults',
-                                          re.IGNORECASE | re.MULTILINE))
-        gaap_obj.shares_outstanding = \
-            self.data_processing(shares_outstanding, xbrl, ignore_errors, logger, context_ids)
-
-        assets = \
-            xbrl.find_all(name=re.compile('jppfs_cor:Assets',
-                                          re.IGNORECASE | re.MULTILINE))
-        gaap_obj.assets = \
-            self.data_processing(assets, xbrl, ignore_errors, logger, context_ids)
-
-        current_assets = \
-            xbrl.find_all(name=re.compile('jppfs_cor:CurrentAssets',
-                                          re.IGNORECASE | re.MULTILINE))
-        gaap_obj.current_assets = \
-            self.data_processing(current_assets, xbrl, ignore_errors, logger, context_ids)
-
-        non_current_assets = \
-            xbrl.find_all(name=re.compile('jppfs_cor:NonCurrentAssets',
-                                          re.IGNORECASE | re.MULTILINE))
-        gaap_obj.non_current_assets = \
-            self.data_processing(non_current_assets, xbrl, ignore_errors, logger, context_ids)
-
-        liabilities = \
-            xbrl.find_all(name=re.compile('jppfs_cor:Liabilities',
-                                          re.IGNORECASE | re.MULTILINE))
-        gaap_obj.liabilities = \
-            self.data_processing(liabilities, xbrl, ignore_errors, logger, context_ids)
-
-        current_liabilities = \
-            xbrl.find_all(name=re.compile('jppfs_cor:CurrentLiabilities',
-                                          re.IGNORECASE | re.MULTILINE))
-        gaap_obj.current_liabilities = \
-            self.data_processing(current_liabilities, xbrl, ignore_errors, logger, context_ids)
-
-        non_current_liabilities = \
-            xbrl.find_all(name=re.compile('jppfs_cor:NonCurrentLiabilities',
-                                          re.IGNORECASE | re.MULTILINE))
-        gaap_obj.non_current_liabilities = \
-            self.data_processing(non_current_liabilities, xbrl, ignore_errors, logger, context_ids)
-
-        net_assets = \
-            xbrl.find_all(name=re.compile('jppfs_cor:NetAssets',
-                                          re.IGNORECASE | re.MULTILINE))
-        gaap_obj.net_assets = \
-            self.data_processing(net_assets, xbrl, ignore_errors, logger, context_ids)
+        elements = GAAP_ELEMENTS_BY_STANDARD.get(dei.accounting_standards, ())
+        for element in elements:
+            value = self.data_processing(index.get(element.key, []), xbrl, ignore_errors, logger,
+                                         context_ids.get((element.period, element.fallback), []))
+            setattr(gaap_obj, element.attr, value)
 
         return gaap_obj
 
+    @metrics.timed('parser.parseGAAPPeriods')
+    def parseGAAPPeriods(self,
+                         xbrl,
+                         contexts=None,
+                         ignore_errors=0,
+                         consolidated=True):
+        """
+        Parse Japan GAAP, US GAAP or IFRS for several periods at once and
+        return a DataFrame indexed by period with one column per GAAP
+        attribute. By default the periods are PERIODS ('Current', 'Prior1',
+        ...) for annual reports and QUARTERLY_PERIODS for quarterly ones.
+        Each element's facts are walked once for all periods, DEI is parsed
+        once and the values are converted in bulk.
+        """
+        # pandas is only loaded by the calls that build frames
+        from pandas import DataFrame, Index, Series, to_numeric
+
+        index = self.tag_index(xbrl)
+        dei = self.parseDEI(xbrl, ignore_errors)
+        table = self.context_table(xbrl)
+
+        if contexts is None:
+            contexts = self.periods(dei)
+
+        # (period, context ids in order of preference), per context kind and
+        # non-consolidated fallback
+        wanted = {}
+        for kind in (INSTANT, DURATION):
+            for fallback in (False, True):
+                scopes = self._scopes(dei, consolidated, fallback)
+                wanted[kind, fallback] = [(c, table.context_ids(c, kind, scopes)) for c in contexts]
+        wanted_ids = dict((key, set(i for _, ids in periods for i in ids)) for key, periods in wanted.items())
+
+        columns = []
+        cells = []
+        texts = []
+        for element in GAAP_ELEMENTS_BY_STANDARD.get(dei.accounting_standards, ()):
+            if element.attr not in columns:
+                columns.append(element.attr)
+
+            key = (element.period, element.fallback)
+            by_context = self._facts_by_context(index.get(element.key, []), wanted_ids[key])
+            for period, ids in wanted[key]:
+                fact = self._select_fact(by_context, ids)
+                cells.append((period, element.attr))
+                texts.append(fact.text if fact is not None else None)
+
+        # later entries override earlier ones for the same attribute
+        values = to_numeric(Series(texts, dtype=object), errors='coerce').fillna(0.0)
+        rows = dict((c, {}) for c in contexts)
+        for (period, attr), value in zip(cells, values):
+            rows[period][attr] = value
+
+        return DataFrame([rows[c] for c in contexts],
+                         index=Index(contexts, name='period'),
+                         columns=columns)
+
+    @staticmethod
+    def periods(dei):
+        """
+        Return the periods reported by a filing, from its DEI period type.
+        """
+        return QUARTERLY_PERIODS if dei.period_type in QUARTERLY_PERIOD_TYPES else PERIODS
+
+    @staticmethod
+    def _scopes(dei, consolidated, fallback=False):
+        # Per-share and share-count figures (elements with `fallback` set)
+        # are often only reported for the filer itself, so consolidated
+        # lookups of them fall back on non-consolidated facts; other
+        # consolidated figures never do. Filers without consolidated
+        # statements only report their own ones.
+        if consolidated and dei.consolidated != 'false':
+            return (True, False) if fallback else (True,)
+        return (False, True) if dei.consolidated == 'false' else (False,)
+
+    @staticmethod
+    def _facts_by_context(facts, context_ids):
+        """
+        Return context id -> first fact (in document order) for the facts whose
+        contextref is one of `context_ids`.
+        """
+        by_context = {}
+        for fact in facts:
+            contextref = fact.attrs.get('contextref')
+            if contextref in context_ids and contextref not in by_context:
+                by_context[contextref] = fact
+        return by_context
+
+    @staticmethod
+    def _select_fact(by_context, context_ids):
+        for context_id in context_ids:
+            fact = by_context.get(context_id)
+            if fact is not None:
+                return fact
+        return None
+
+    @classmethod
+    def context_table(self, xbrl):
+        """
+        Return the filing's ContextTable (context id -> Context), built once
+        from the xbrli:context elements and cached like the tag index.
+        """
+        if isinstance(xbrl, FactIndex):
+            return xbrl.contexts
+
+        table = vars(xbrl).get('_ufo_context_table')
+        if table is None:
+            table = ContextTable(_soup_context(tag) for tag in self.tag_index(xbrl).get('xbrli:context', []))
+            xbrl._ufo_context_table = table
+        return table
+
+    @classmethod
+    def tag_index(self, xbrl):
+        """
+        Return a dict of lowercased, namespaced tag name -> elements in
+        document order. The soup is walked once and the index is cached on it,
+        so every metric lookup afterwards is a dict access.
+        """
+        if isinstance(xbrl, FactIndex):
+            return xbrl
+
+        # vars() avoids bs4's Tag.__getattr__, which would search the tree
+        index = vars(xbrl).get('_ufo_tag_index')
+        if index is None:
+            index = {}
+            with metrics.timer('parser.tag_index'):
+                for tag in xbrl.find_all(True):
+                    index.setdefault(tag.name.lower(), []).append(tag)
+            xbrl._ufo_tag_index = index
+        return index
+
+    @staticmethod
+    def find_tags(index, name):
+        """
+        Look up the elements named `name` (e.g. 'jppfs_cor:Assets') in a tag index.
+        """
+        return index.get(name.lower(), [])
+
     @classmethod
+    @metrics.timed('parser.data_processing')
     def data_processing(self,
                         elements,
                         xbrl,
@@ -303,23 +391,18 @@ class UfoXBRLParser(XBRLParser):
                 return elements[0].text
 
         if options['no_context'] == True:
-            if len(elements) > 0 and XBRLParser().is_number(elements[0].text):
+            if len(elements) > 0 and self.is_number(elements[0].text):
                 return elements[0].text
 
         try:
 
-            # Extract the correct values by context
-            correct_elements = []
-            for element in elements:
-                contextrefs = element.attrs['contextref'].split('_')
-
-                if any([context_id in contextrefs for context_id in context_ids]):
-                    correct_elements.append(element)
-
-            elements = correct_elements
+            # Extract the correct value by context; context_ids are in order
+            # of preference
+            by_context = self._facts_by_context(elements, set(context_ids))
+            element = self._select_fact(by_context, context_ids)
 
-            if len(elements) > 0 and XBRLParser().is_number(elements[0].text):
-                return float(elements[0].text)
+            if element is not None and self.is_number(element.text):
+                return float(element.text)
             else:
                 return 0
 
@@ -344,6 +427,7 @@ class UfoXBRLParser(XBRLParser):
                 logger.error(str(e) + " error at " + ''.join(elements[0].text))
 
     @classmethod
+    @metrics.timed('parser.parseDEI')
     def parseDEI(self,
                  xbrl,
                  ignore_errors=0):
@@ -351,6 +435,7 @@ class UfoXBRLParser(XBRLParser):
         Parse DEI from our XBRL soup and return a DEI object.
         """
         dei_obj = DEI()
+        index = self.tag_index(xbrl)
 
         if ignore_errors == 2:
             logging.basicConfig(filename='/tmp/xbrl.log',
@@ -361,58 +446,131 @@ class UfoXBRLParser(XBRLParser):
             logger = None
 
         # DEI
-        edinet_code = \
-            xbrl.find_all(name=re.compile('jpdei_cor:EDINETCodeDEI',
-                                          re.IGNORECASE | re.MULTILINE))
-        dei_obj.edinet_code = \
-            self.data_processing(edinet_code, xbrl, ignore_errors, logger,
-                                 options={'type': 'String',
-                                          'no_context': True})
-
-        trading_symbol = \
-            xbrl.find_all(name=re.compile('jpdei_cor:SecurityCodeDei', re.IGNORECASE | re.MULTILINE))
-        dei_obj.trading_symbol = \
-            self.data_processing(trading_symbol, xbrl, ignore_errors, logger,
-                                 options={'type': 'String',
-                                          'no_context': True})
-
-        company_name = \
-            xbrl.find_all(name=re.compile('jpcrp_cor:CompanyNameCoverPage',
-                                          re.IGNORECASE | re.MULTILINE))
-        dei_obj.company_name = \
-            self.data_processing(company_name, xbrl, ignore_errors, logger,
-                                 options={'type': 'String',
-                                          'no_context': True})
-
-        accounting_standards = \
-            xbrl.find_all(name=re.compile('jpdei_cor:AccountingStandardsDEI',
-                                          re.IGNORECASE | re.MULTILINE))
-        dei_obj.accounting_standards = \
-            self.data_processing(accounting_standards, xbrl, ignore_errors, logger,
-                                 options={'type': 'String',
-                                          'no_context': True})
-
-        current_fy_start = \
-            xbrl.find_all(name=re.compile('jpdei_cor:CurrentFiscalYearStartDateDei',
-                                          re.IGNORECASE | re.MULTILINE))
-        dei_obj.current_fy_start = \
-            self.data_processing(current_fy_start, xbrl, ignore_errors, logger,
-                                 options={'type': 'String',
-                                          'no_context': True})
-
-        current_fy_end = \
-            xbrl.find_all(name=re.compile('jpdei_cor:CurrentFiscalYearEndDateDei',
-                                          re.IGNORECASE | re.MULTILINE))
-        dei_obj.current_fy_end = \
-            self.data_processing(current_fy_end, xbrl, ignore_errors, logger,
-                                 options={'type': 'String',
-                                          'no_context': True})
+        for element in DEI_ELEMENTS:
+            value = self.data_processing(index.get(element.key, []), xbrl, ignore_errors, logger,
+                                         options={'type': 'String',
+                                                  'no_context': True})
+            setattr(dei_obj, element.attr, value)
 
         return dei_obj
 
 
+# A single fact read by the streaming parser. Mimics the parts of a bs4 Tag
+# that data_processing uses (name, attrs['contextref'], text).
+class Fact(object):
+    __slots__ = ('name', 'attrs', 'text')
+
+    def __init__(self, name, contextref, text, unitref=None, decimals=None):
+        self.name = name
+        self.attrs = {'contextref': contextref,
+                      'unitref': unitref,
+                      'decimals': decimals}
+        self.text = text
+
+
+# Lowercased tag name -> Facts, as returned by UfoXBRLParser.parseStream.
+# `contexts` holds the filing's ContextTable.
+class FactIndex(dict):
+    contexts = None
+
+
+# A context's id, period ('instant' or 'duration', start and end dates) and
+# the explicit dimension members of its scenario/segment
+Context = namedtuple('Context', ['id', 'period_type', 'start', 'end', 'members'])
+
+
+def _soup_context(tag):
+    instant = tag.find('xbrli:instant')
+    start = tag.find('xbrli:startdate')
+    end = tag.find('xbrli:enddate')
+    members = tuple(sorted(m.text.strip() for m in tag.find_all('xbrldi:explicitmember')))
+    if instant is not None:
+        return Context(tag.attrs.get('id'), 'instant', None, instant.text.strip(), members)
+    return Context(tag.attrs.get('id'), 'duration',
+                   start.text.strip() if start is not None else None,
+                   end.text.strip() if end is not None else None,
+                   members)
+
+
+def _stream_context(elem):
+    instant = elem.findtext('.//' + _XBRLI + 'instant')
+    members = tuple(sorted((m.text or '').strip() for m in elem.iter(_XBRLDI + 'explicitMember')))
+    if instant is not None:
+        return Context(elem.get('id'), 'instant', None, instant.strip(), members)
+    start = elem.findtext('.//' + _XBRLI + 'startDate')
+    end = elem.findtext('.//' + _XBRLI + 'endDate')
+    return Context(elem.get('id'), 'duration',
+                   start.strip() if start is not None else None,
+                   end.strip() if end is not None else None,
+                   members)
+
+
+# Context id -> Context for one filing
+class ContextTable(dict):
+    def __init__(self, contexts=()):
+        contexts = list(contexts)
+        super(ContextTable, self).__init__((c.id, c) for c in contexts)
+        # (id prefix, members) -> id, e.g. ('Prior1YearInstant', ()) -> 'Prior1YearInstant'
+        self._ids = dict(((c.id.split('_')[0], c.members), c.id) for c in contexts)
+
+    def context_ids(self, period, kind, scopes=(True,)):
+        """
+        Return the ids of the contexts holding `period`'s ('Current',
+        'Prior1', 'CurrentQuarter', ...) Instant or Duration facts with no other dimension than
+        consolidated (scope True) or non-consolidated (scope False), in the
+        order of `scopes`. Contexts carrying any other member (segments,
+        equity components, ...) are never returned.
+        """
+        base = CONTEXTS[period][kind]
+        ids = []
+        for consolidated in scopes:
+            if not self:
+                # no contexts read; fall back on EDINET's context naming
+                ids.append(base if consolidated else base + '_NonConsolidatedMember')
+            else:
+                members = () if consolidated else (_NON_CONSOLIDATED_MEMBER,)
+                context_id = self._ids.get((base, members))
+                if context_id is not None:
+                    ids.append(context_id)
+        return ids
+
+
+# Common base of the GAAP/DEI objects. Attributes live in __slots__ (no
+# per-object __dict__), which keeps hundreds of thousands of them small.
+class _Record(object):
+    __slots__ = ()
+
+    def to_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    @property
+    def __dict__(self):
+        # a read-only copy, for callers written before __slots__
+        return self.to_dict()
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        # pickles made before __getstate__ hold (None, slot values)
+        if isinstance(state, tuple):
+            state = state[1]
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__,
+                           ', '.join('%s=%r' % (name, getattr(self, name)) for name in self.__slots__))
+
+
 # Base US GAAP object
-class USGAAP(object):
+class USGAAP(_Record):
+    __slots__ = ('revenues', 'operating_income_loss', 'profit_loss_before_tax', 'net_income_loss',
+                 'comprehensive_income', 'basic_eps', 'diluted_eps', 'per',
+                 'cf_from_operating', 'cf_from_investing', 'cf_from_financing', 'shares_outstanding',
+                 'assets', 'current_assets', 'non_current_assets', 'liabilities',
+                 'current_liabilities', 'non_current_liabilities', 'net_assets')
+
     def __init__(self,
                  revenues=0.0,
                  operating_income_loss=0.0,
@@ -425,7 +583,14 @@ class USGAAP(object):
                  cf_from_operating=0.0,
                  cf_from_investing=0.0,
                  cf_from_financing=0.0,
-                 shares_outstanding=0.0):
+                 shares_outstanding=0.0,
+                 assets=0.0,
+                 current_assets=0.0,
+                 non_current_assets=0.0,
+                 liabilities=0.0,
+                 current_liabilities=0.0,
+                 non_current_liabilities=0.0,
+                 net_assets=0.0):
         self.revenues = revenues
         self.operating_income_loss = operating_income_loss
         self.profit_loss_before_tax = profit_loss_before_tax
@@ -438,10 +603,24 @@ class USGAAP(object):
         self.cf_from_investing = cf_from_investing
         self.cf_from_financing = cf_from_financing
         self.shares_outstanding = shares_outstanding
+        self.assets = assets
+        self.current_assets = current_assets
+        self.non_current_assets = non_current_assets
+        self.liabilities = liabilities
+        self.current_liabilities = current_liabilities
+        self.non_current_liabilities = non_current_liabilities
+        self.net_assets = net_assets
 
 
 # Base Japan GAAP object
-class JapanGAAP(object):
+class JapanGAAP(_Record):
+    __slots__ = ('netsales', 'ordinary_income_loss', 'profit_loss', 'comprehensive_income',
+                 'net_assets', 'total_assets', 'bps', 'dps', 'basic_eps', 'diluted_eps',
+                 'equity_to_asset_ratio', 'roe', 'per',
+                 'cf_from_operating', 'cf_from_investing', 'cf_from_financing', 'shares_outstanding',
+                 'assets', 'current_assets', 'non_current_assets', 'liabilities',
+                 'current_liabilities', 'non_current_liabilities')
+
     def __init__(self,
                  netsales=0.0,
                  ordinary_income_loss=0.0,
@@ -459,7 +638,13 @@ class JapanGAAP(object):
                  cf_from_operating=0.0,
                  cf_from_investing=0.0,
                  cf_from_financing=0.0,
-                 shares_outstanding=0.0):
+                 shares_outstanding=0.0,
+                 assets=0.0,
+                 current_assets=0.0,
+                 non_current_assets=0.0,
+                 liabilities=0.0,
+                 current_liabilities=0.0,
+                 non_current_liabilities=0.0):
         self.netsales = netsales
         self.ordinary_income_loss = ordinary_income_loss
         self.profit_loss = profit_loss
@@ -477,20 +662,164 @@ class JapanGAAP(object):
         self.cf_from_investing = cf_from_investing
         self.cf_from_financing = cf_from_financing
         self.shares_outstanding = shares_outstanding
+        self.assets = assets
+        self.current_assets = current_assets
+        self.non_current_assets = non_current_assets
+        self.liabilities = liabilities
+        self.current_liabilities = current_liabilities
+        self.non_current_liabilities = non_current_liabilities
 
 
 # Base DEI object
-class DEI(object):
+class DEI(_Record):
+    __slots__ = ('edinet_code', 'trading_symbol', 'company_name', 'accounting_standards',
+                 'current_fy_start', 'current_fy_end', 'consolidated', 'period_type', 'current_period_end')
+
     def __init__(self,
                  edinet_code='',
                  trading_symbol='',
                  company_name='',
                  accounting_standards='',
                  current_fy_start='',
-                 current_fy_end=''):
+                 current_fy_end='',
+                 consolidated='',
+                 period_type='',
+                 current_period_end=''):
         self.edinet_code = edinet_code
         self.trading_symbol = trading_symbol
         self.company_name = company_name
         self.accounting_standards = accounting_standards
         self.current_fy_start = current_fy_start
         self.current_fy_end = current_fy_end
+        self.consolidated = consolidated
+        self.period_type = period_type
+        self.current_period_end = current_period_end
+
+
+# Base IFRS object
+class IFRSGAAP(_Record):
+    __slots__ = ('revenues', 'profit_loss_before_tax', 'profit_loss', 'comprehensive_income',
+                 'equity', 'total_assets', 'bps', 'basic_eps', 'diluted_eps',
+                 'equity_to_asset_ratio', 'roe', 'per',
+                 'cf_from_operating', 'cf_from_investing', 'cf_from_financing', 'shares_outstanding',
+                 'assets', 'current_assets', 'non_current_assets', 'liabilities',
+                 'current_liabilities', 'non_current_liabilities', 'net_assets')
+
+    def __init__(self,
+                 revenues=0.0,
+                 profit_loss_before_tax=0.0,
+                 profit_loss=0.0,
+                 comprehensive_income=0.0,
+                 equity=0.0,
+                 total_assets=0.0,
+                 bps=0.0,
+                 basic_eps=0.0,
+                 diluted_eps=0.0,
+                 equity_to_asset_ratio=0.0,
+                 roe=0.0,
+                 per=0.0,
+                 cf_from_operating=0.0,
+                 cf_from_investing=0.0,
+                 cf_from_financing=0.0,
+                 shares_outstanding=0.0,
+                 assets=0.0,
+                 current_assets=0.0,
+                 non_current_assets=0.0,
+                 liabilities=0.0,
+                 current_liabilities=0.0,
+                 non_current_liabilities=0.0,
+                 net_assets=0.0):
+        self.revenues = revenues
+        self.profit_loss_before_tax = profit_loss_before_tax
+        self.profit_loss = profit_loss
+        self.comprehensive_income = comprehensive_income
+        self.equity = equity
+        self.total_assets = total_assets
+        self.bps = bps
+        self.basic_eps = basic_eps
+        self.diluted_eps = diluted_eps
+        self.equity_to_asset_ratio = equity_to_asset_ratio
+        self.roe = roe
+        self.per = per
+        self.cf_from_operating = cf_from_operating
+        self.cf_from_investing = cf_from_investing
+        self.cf_from_financing = cf_from_financing
+        self.shares_outstanding = shares_outstanding
+        self.assets = assets
+        self.current_assets = current_assets
+        self.non_current_assets = non_current_assets
+        self.liabilities = liabilities
+        self.current_liabilities = current_liabilities
+        self.non_current_liabilities = non_current_liabilities
+        self.net_assets = net_assets
+
+
+# GAAP object class per DEI accounting standard
+GAAP_CLASSES = {
+    JAPAN_GAAP: JapanGAAP,
+    US_GAAP: USGAAP,
+    IFRS: IFRSGAAP,
+}
+
+
+# Many filings' GAAP values as one float64 array (a row per filing, a
+# column per field), with column access by attribute name
+class GAAPBatch(object):
+    def __init__(self, fields=JapanGAAP.__slots__, capacity=1024):
+        import numpy
+
+        self.fields = tuple(fields)
+        self.keys = []
+        self._columns = dict((name, i) for i, name in enumerate(self.fields))
+        self._values = numpy.zeros((capacity, len(self.fields)))
+        self._size = 0
+
+    @classmethod
+    def from_records(cls, records, keys=None, fields=None):
+        """
+        Build a batch from GAAP objects (and optional row keys).
+        """
+        records = list(records)
+        if fields is None:
+            fields = type(records[0]).__slots__ if records else JapanGAAP.__slots__
+        batch = cls(fields, capacity=max(len(records), 1))
+        for i, record in enumerate(records):
+            batch.append(record, keys[i] if keys is not None else None)
+        return batch
+
+    def append(self, record, key=None):
+        if self._size == len(self._values):
+            import numpy
+
+            grown = numpy.zeros((2 * len(self._values), len(self.fields)))
+            grown[:self._size] = self._values
+            self._values = grown
+
+        row = self._values[self._size]
+        for name, i in self._columns.items():
+            row[i] = getattr(record, name, 0.0) or 0.0
+        self.keys.append(key)
+        self._size += 1
+
+    @property
+    def values(self):
+        return self._values[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    def __getattr__(self, name):
+        # only reached for names that aren't regular attributes
+        columns = self.__dict__.get('_columns', {})
+        if name in columns:
+            return self.values[:, columns[name]]
+        raise AttributeError(name)
+
+    def to_frame(self):
+        """
+        Return a DataFrame over the batch's array (no copy is made).
+        """
+        from pandas import DataFrame
+
+        index = self.keys if any(k is not None for k in self.keys) else None
+        return DataFrame(self.values, index=index, columns=list(self.fields), copy=False)
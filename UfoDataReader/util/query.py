@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Extract arbitrary facts from many XBRL files.
+
+    query = FactQuery(['jppfs_cor:ResearchAndDevelopmentExpensesSGA',
+                       'jpcrp_cor:NetSalesSummaryOfBusinessResults'],
+                      contexts=['Current', 'Prior1'], members=())
+    frame = query.run('filing.xbrl')
+    frame, errors = query.run_many('./xbrl', processes=8)
+"""
+from multiprocessing import Pool
+from pandas import DataFrame, concat, to_numeric
+from UfoDataReader.util.batch import expand_paths
+from UfoDataReader.util.elements import CONTEXTS
+from UfoDataReader.util.parser import UfoXBRLParser
+
+# columns of a query result, one row per fact
+QUERY_COLUMNS = ('edinet_code', 'element', 'context', 'period_type', 'start', 'end',
+                 'members', 'unit', 'decimals', 'value', 'text')
+
+_EDINET_CODE = 'jpdei_cor:edinetcodedei'
+
+# the query of each worker process, sent once by the pool initializer
+_worker_query = None
+
+
+class FactQuery(object):
+    """
+    Facts of the given element QNames (e.g. 'jppfs_cor:NetSales', or an
+    extension element of the filer), compiled once and run over any number
+    of filings in a single streaming pass each.
+
+    contexts : period names ('Current', 'Prior1', 'CurrentQuarter', ...) or
+        context ids; a fact matches if its context id is one of them once
+        the dimension suffix is removed. None for every context.
+    members : None for any dimension members, () for contexts without
+        members (the consolidated figures), or members the context must
+        all have (e.g. ['jppfs_cor:NonConsolidatedMember']).
+    """
+
+    def __init__(self, elements, contexts=None, members=None):
+        if isinstance(elements, str):
+            elements = [elements]
+        if isinstance(contexts, str):
+            contexts = [contexts]
+
+        self.elements = tuple(elements)
+        self.contexts = tuple(contexts) if contexts is not None else None
+        self.members = tuple(members) if members is not None else None
+
+        # lowercased name -> QName as given; the index is lowercased, but
+        # prefixes are matched against the filing's namespace declarations,
+        # where filer extension prefixes keep their capitals
+        self._names = dict((e.lower(), e) for e in self.elements)
+        self._prefixes = frozenset(e.split(':')[0] for e in self.elements) | {'jpdei_cor'}
+
+        self._context_ids = None
+        if self.contexts is not None:
+            self._context_ids = set()
+            for c in self.contexts:
+                if c in CONTEXTS:
+                    self._context_ids.update(CONTEXTS[c].values())
+                else:
+                    self._context_ids.add(c)
+
+    def _match_context(self, context):
+        if self._context_ids is not None and context.id.split('_')[0] not in self._context_ids:
+            return False
+        if self.members is None:
+            return True
+        if not self.members:
+            return not context.members
+        return set(self.members).issubset(context.members)
+
+    def run(self, file_handle):
+        """
+        Run the query on one XBRL file name or binary file object and return
+        a long-format DataFrame of QUERY_COLUMNS. `value` is the fact as a
+        number (NaN for text facts), `text` its raw text.
+        """
+        context_ids = None
+        if self._context_ids is not None:
+            context_ids = self._context_ids | {'FilingDateInstant'}
+
+        contexts = []
+        facts = []
+        edinet_code = None
+        for fact in UfoXBRLParser.iter_facts(file_handle, context_ids, contexts, self._prefixes):
+            if fact.name == _EDINET_CODE and edinet_code is None:
+                edinet_code = fact.text.strip()
+            if fact.name in self._names:
+                facts.append(fact)
+
+        # contexts precede facts in EDINET filings, but the table is only
+        # consulted once the whole document has been read
+        table = dict((c.id, c) for c in contexts)
+        rows = []
+        for fact in facts:
+            context = table.get(fact.attrs['contextref'])
+            if context is None or not self._match_context(context):
+                continue
+            rows.append((edinet_code, self._names[fact.name], context.id, context.period_type,
+                         context.start, context.end, ','.join(context.members),
+                         fact.attrs['unitref'], fact.attrs['decimals'], fact.text, fact.text))
+
+        frame = DataFrame(rows, columns=QUERY_COLUMNS)
+        frame['value'] = to_numeric(frame['value'], errors='coerce').astype('float64')
+        return frame
+
+    def run_many(self, paths, processes=None, chunksize=8):
+        """
+        Run the query on every XBRL file under `paths` (directories, globs
+        or file names) on a process pool and return (frame, errors): one
+        DataFrame with a `file` column, and a dict of file name -> error
+        message for failed files. processes=1 runs in this process.
+        """
+        paths = expand_paths(paths)
+        if processes == 1:
+            results = [_run_query(self, path) for path in paths]
+        else:
+            with Pool(processes, initializer=_init_worker, initargs=(self,)) as pool:
+                results = list(pool.imap_unordered(_run_worker_query, paths, chunksize))
+
+        frames = []
+        errors = {}
+        for path, frame, error in results:
+            if error is None:
+                frames.append(frame)
+            else:
+                errors[path] = error
+
+        if not frames:
+            return None, errors
+        return concat(frames, ignore_index=True), errors
+
+
+def _run_query(query, path):
+    try:
+        frame = query.run(path)
+    except Exception as e:
+        return path, None, '%s: %s' % (type(e).__name__, e)
+    frame['file'] = path
+    return path, frame, None
+
+
+def _init_worker(query):
+    global _worker_query
+    _worker_query = query
+
+
+def _run_worker_query(path):
+    return _run_query(_worker_query, path)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar store of parsed GAAP values (requires pyarrow).
+
+Facts are kept in long format, one row per (filing, period, metric), in a
+Parquet dataset partitioned by fiscal year of the period end:
+
+    store = FundamentalsStore('fundamentals')
+    store.append(to_facts(dei, parser.parseGAAPPeriods(xbrl), docid='S100ABCD'))
+    store.query(symbols=['27530'], metrics=['netsales'], start='2014-01-01')
+"""
+import re
+from pandas import DataFrame, DateOffset, Timestamp
+
+FACT_COLUMNS = ('edinet_code', 'trading_symbol', 'period', 'period_end',
+                'standard', 'metric', 'value', 'docid')
+
+
+def _period_end(dei, period):
+    # Prior<n>[Quarter] ends n years before the current period
+    end = Timestamp(dei.current_period_end or dei.current_fy_end)
+    prior = re.match(r'Prior(\d+)', period)
+    if prior is not None:
+        end -= DateOffset(years=int(prior.group(1)))
+    return end
+
+
+def to_facts(dei, gaap, docid=None):
+    """
+    Convert one filing's GAAP values to a long-format fact DataFrame.
+    `gaap` is a GAAP object (of the Current period) or a parseGAAPPeriods
+    DataFrame.
+    """
+    if isinstance(gaap, DataFrame):
+        frame = gaap
+    else:
+        frame = DataFrame([gaap.to_dict()], index=['Current'])
+
+    rows = []
+    for period, values in frame.iterrows():
+        period_end = _period_end(dei, period)
+        for metric, value in values.items():
+            rows.append((dei.edinet_code, dei.trading_symbol, period, period_end,
+                         dei.accounting_standards, metric, float(value), docid))
+
+    facts = DataFrame(rows, columns=FACT_COLUMNS)
+    facts['fiscal_year'] = facts['period_end'].dt.year
+    return facts
+
+
+class FundamentalsStore(object):
+    """
+    Parquet dataset of facts under `directory`, partitioned by fiscal_year.
+    Queries push symbol/metric/date filters down to the Parquet reader, so
+    only matching partitions and row groups are read.
+    """
+
+    def __init__(self, directory):
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError('FundamentalsStore requires pyarrow')
+        self.directory = directory
+
+    def append(self, facts):
+        """
+        Append a fact DataFrame (see to_facts) as new files in the dataset.
+        """
+        import pyarrow
+        import pyarrow.parquet as pq
+
+        if len(facts) == 0:
+            return
+        table = pyarrow.Table.from_pandas(facts, preserve_index=False)
+        pq.write_to_dataset(table, self.directory, partition_cols=['fiscal_year'])
+
+    def query(self, symbols=None, edinet_codes=None, metrics=None, start=None, end=None, columns=None):
+        """
+        Return the facts matching every given filter as a DataFrame.
+        symbols are securities codes, start/end bound period_end.
+        """
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(self.directory, format='parquet', partitioning='hive')
+
+        filters = []
+        if symbols is not None:
+            filters.append(ds.field('trading_symbol').isin([str(s) for s in symbols]))
+        if edinet_codes is not None:
+            filters.append(ds.field('edinet_code').isin(list(edinet_codes)))
+        if metrics is not None:
+            filters.append(ds.field('metric').isin(list(metrics)))
+        if start is not None:
+            start = Timestamp(start)
+            filters.append(ds.field('fiscal_year') >= start.year)
+            filters.append(ds.field('period_end') >= start.to_datetime64())
+        if end is not None:
+            end = Timestamp(end)
+            filters.append(ds.field('fiscal_year') <= end.year)
+            filters.append(ds.field('period_end') <= end.to_datetime64())
+
+        expression = None
+        for f in filters:
+            expression = f if expression is None else expression & f
+
+        return dataset.to_table(columns=list(columns) if columns else None,
+                                filter=expression).to_pandas()
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for ufocatch that replays recorded Atom feeds and ZIPs.
+
+A recording directory holds one feed per symbol and one ZIP per docid:
+
+    feeds/<symbol>.xml
+    data/<docid>.zip
+
+Links to resource.ufocatch.com in the feeds are rewritten to the mock
+server, so feeds saved with `record` replay as they are.
+
+    python benchmarks/mock_server.py record recordings 2753 7203
+    python benchmarks/mock_server.py serve recordings --port 8000
+"""
+import argparse
+import hashlib
+import os
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_UFOCATCH_URL = 'http://resource.ufocatch.com'
+_ATOM_NAMESPACE = '{http://www.w3.org/2005/Atom}'
+
+_FEED = '''<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+<title>ufocatch query {symbol}</title>
+{entries}
+</feed>
+'''
+
+_ENTRY = '''<entry>
+<title>【{edinet_code}】{company} 有価証券報告書</title>
+<id>urn:ufocatch:{docid}</id>
+<docid>{docid}</docid>
+<updated>{updated}</updated>
+<link type="application/zip" href="{base_url}/data/{docid}.zip"/>
+</entry>'''
+
+
+def generate_recordings(directory, xbrl, symbols, filings=4):
+    """
+    Write a synthetic recording of `filings` annual reports per symbol, each
+    a ZIP holding the XBRL document `xbrl` (bytes).
+    """
+    os.makedirs(os.path.join(directory, 'feeds'), exist_ok=True)
+    os.makedirs(os.path.join(directory, 'data'), exist_ok=True)
+
+    for symbol in symbols:
+        entries = []
+        # newest first, as ufocatch lists them
+        for i in reversed(range(filings)):
+            docid = 'S%s%03d' % (symbol, i)
+            entries.append(_ENTRY.format(edinet_code='E%s' % symbol, company=symbol, docid=docid,
+                                         updated='%d-06-23T15:00:00+09:00' % (2010 + i),
+                                         base_url=_UFOCATCH_URL))
+
+            with zipfile.ZipFile(os.path.join(directory, 'data', docid + '.zip'), 'w',
+                                 zipfile.ZIP_DEFLATED) as z:
+                z.writestr('XBRL/PublicDoc/jpcrp030000-asr-001_%s.xbrl' % docid, xbrl)
+                z.writestr('XBRL/AuditDoc/jpaud-aar-cn-001_%s.xbrl' % docid, b'')
+
+        with open(os.path.join(directory, 'feeds', '%s.xml' % symbol), 'w', encoding='utf-8') as f:
+            f.write(_FEED.format(symbol=symbol, entries='\n'.join(entries)))
+
+
+def record(directory, symbols, base_url=_UFOCATCH_URL, max_filings=None):
+    """
+    Save the live feeds of `symbols` and the ZIPs they link to under
+    `directory`, for replay by MockUfocatch.
+    """
+    import requests
+    import xml.etree.ElementTree as ElemTree
+
+    os.makedirs(os.path.join(directory, 'feeds'), exist_ok=True)
+    os.makedirs(os.path.join(directory, 'data'), exist_ok=True)
+
+    session = requests.Session()
+    for symbol in symbols:
+        r = session.get(base_url + '/atom/edinetx/query/%s' % symbol)
+        r.raise_for_status()
+        with open(os.path.join(directory, 'feeds', '%s.xml' % symbol), 'wb') as f:
+            f.write(r.content)
+
+        entries = ElemTree.fromstring(r.content).findall('.//' + _ATOM_NAMESPACE + 'entry')
+        for el in entries[:max_filings]:
+            docid = el.find(_ATOM_NAMESPACE + 'docid').text
+            link = el.find(_ATOM_NAMESPACE + 'link[@type="application/zip"]')
+            path = os.path.join(directory, 'data', docid + '.zip')
+            if link is None or os.path.exists(path):
+                continue
+            r = session.get(link.attrib['href'])
+            r.raise_for_status()
+            with open(path, 'wb') as f:
+                f.write(r.content)
+            # be as polite as UfoReader is by default
+            time.sleep(1.0)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        if server.latency:
+            time.sleep(server.latency)
+
+        body = server.lookup(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        content_type = 'application/zip' if self.path.endswith('.zip') else 'application/atom+xml'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+        server.bytes_sent += len(body)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, directory, latency):
+        ThreadingHTTPServer.__init__(self, address, _Handler)
+        self.directory = directory
+        self.latency = latency
+        self.requests = 0
+        self.bytes_sent = 0
+        self.base_url = 'http://%s:%d' % self.server_address[:2]
+        self._bodies = {}
+
+    def lookup(self, path):
+        # bodies are read once and kept, so disk reads stay out of timings
+        path = path.split('?')[0]
+        if path not in self._bodies:
+            if path.startswith('/atom/edinetx/query/'):
+                file_name = os.path.join(self.directory, 'feeds', path.rstrip('/').split('/')[-1] + '.xml')
+            elif path.endswith('.zip'):
+                file_name = os.path.join(self.directory, 'data', path.split('/')[-1])
+            else:
+                return None
+            try:
+                with open(file_name, 'rb') as f:
+                    body = f.read()
+            except IOError:
+                return None
+            if file_name.endswith('.xml'):
+                body = body.replace(_UFOCATCH_URL.encode('ascii'), self.base_url.encode('ascii'))
+            self._bodies[path] = body
+        return self._bodies[path]
+
+
+class MockUfocatch(object):
+    """
+    Serve a recording directory over HTTP on localhost in a background
+    thread. `latency` seconds are added to every response.
+
+        with MockUfocatch('recordings') as server:
+            UfoReader(symbols, base_url=server.base_url).read()
+    """
+
+    def __init__(self, directory, port=0, latency=0.0):
+        self._server = _Server(('127.0.0.1', port), directory, latency)
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return self._server.base_url
+
+    @property
+    def requests(self):
+        return self._server.requests
+
+    @property
+    def bytes_sent(self):
+        return self._server.bytes_sent
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Record or replay ufocatch feeds and ZIPs.')
+    commands = arg_parser.add_subparsers(dest='command')
+    commands.required = True
+
+    record_parser = commands.add_parser('record', help='save live feeds and ZIPs')
+    record_parser.add_argument('directory')
+    record_parser.add_argument('symbols', nargs='+')
+    record_parser.add_argument('-n', '--max-filings', type=int, default=None,
+                               help='ZIPs to save per symbol (default: all)')
+
+    serve_parser = commands.add_parser('serve', help='replay a recording')
+    serve_parser.add_argument('directory')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    serve_parser.add_argument('--latency', type=float, default=0.0)
+    args = arg_parser.parse_args(argv)
+
+    if args.command == 'record':
+        record(args.directory, args.symbols, max_filings=args.max_filings)
+    else:
+        server = MockUfocatch(args.directory, args.port, args.latency)
+        print('serving %s on %s' % (args.directory, server.base_url))
+        server._server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
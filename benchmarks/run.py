@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the parser and reader hot paths.
+
+Times UfoXBRLParser.parse / parseStream / parseLxml / parseDEI / parseGAAP
+on the bundled example filing and on synthetic filings `--scale` times its
+size, and UfoReader throughput against a MockUfocatch replaying a recording.
+Results are written as JSON; with --compare, a run is checked against an
+earlier result file and the exit status is 1 if any benchmark got slower
+than --threshold allows.
+
+    python benchmarks/run.py -o baseline.json
+    python benchmarks/run.py -o current.json --compare baseline.json
+"""
+import argparse
+import gc
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+
+from mock_server import MockUfocatch, generate_recordings
+from synthetic import count_facts, make_filing
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _ROOT)
+
+from UfoDataReader.io.data import UfoReader
+from UfoDataReader.util.parser import UfoXBRLParser
+from UfoDataReader.util.query import FactQuery
+
+_EXAMPLE = glob.glob(os.path.join(_ROOT, 'example', '*.xbrl'))[0]
+
+
+def measure(func, setup=None, repeat=5):
+    """
+    Run `func(setup())` `repeat` times and return the best and median wall
+    time, plus the peak traced memory of one more (slower, traced) run.
+    setup() is not timed.
+    """
+    setup = setup or (lambda: None)
+
+    times = []
+    for _ in range(repeat):
+        arg = setup()
+        gc.collect()
+        t = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - t)
+    times.sort()
+
+    arg = setup()
+    gc.collect()
+    tracemalloc.start()
+    func(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'best_s': times[0], 'median_s': times[len(times) // 2], 'peak_mb': peak / 1024 ** 2}
+
+
+def check_example():
+    """
+    Check results on the example filing that the benchmarks rely on, so a
+    fast but wrong parser is not taken for an improvement.
+    """
+    # filer extension prefixes keep their capitals in the namespace declarations
+    element = 'jpcrp030000-asr_E03398-000:AllowanceForShareholdersSpecialBenefitsCL'
+    frame = FactQuery([element]).run(_EXAMPLE)
+    if not len(frame) or set(frame['element']) != {element}:
+        raise AssertionError('FactQuery found no %s facts in the example filing' % element)
+
+
+def parser_benchmarks(name, path, repeat):
+    """
+    Benchmark each parser stage on the XBRL file `path`.
+    """
+    parser = UfoXBRLParser()
+    with open(path, 'rb') as f:
+        xbrl = f.read()
+    facts = count_facts(xbrl)
+    results = []
+
+    def add(stage, stats):
+        stats.update(name='parser.%s.%s' % (stage, name), facts=facts,
+                     facts_per_s=facts / stats['best_s'], bytes=len(xbrl))
+        results.append(stats)
+
+    add('parse', measure(lambda _: parser.parse(path), repeat=repeat))
+    add('parseStream', measure(lambda _: parser.parseStream(path), repeat=repeat))
+    add('parseLxml', measure(lambda _: parser.parseLxml(path), repeat=repeat))
+
+    # each run gets a new document, so no index built by a previous run is reused
+    add('parseDEI', measure(parser.parseDEI, lambda: parser.parse(path), repeat))
+    add('parseGAAP', measure(parser.parseGAAP, lambda: parser.parse(path), repeat))
+    add('parseGAAPPeriods', measure(parser.parseGAAPPeriods, lambda: parser.parse(path), repeat))
+    add('parseGAAP.stream', measure(parser.parseGAAP, lambda: parser.parseStream(path), repeat))
+    add('parseGAAP.lxml', measure(parser.parseGAAP, lambda: parser.parseLxml(path), repeat))
+    return results
+
+
+def reader_benchmarks(recordings, symbols, workers, latency, repeat):
+    """
+    Benchmark UfoReader reading every symbol's feed and filings from a
+    MockUfocatch, for each worker count.
+    """
+    results = []
+    with MockUfocatch(recordings, latency=latency) as server:
+        for max_workers in workers:
+            for parse_xbrl in (False, True):
+                state = {}
+
+                def read(_):
+                    requests, sent = server.requests, server.bytes_sent
+                    reader = UfoReader(symbols, start='2000-01-01', end='2100-01-01',
+                                       fetch_xbrl=True, parse_xbrl=parse_xbrl, max_workers=max_workers,
+                                       rate_limit=None, base_url=server.base_url)
+                    try:
+                        data = reader.read()
+                    finally:
+                        reader.close()
+                    state['filings'] = sum(len(v) for v in data.values() if v)
+                    state['requests'] = server.requests - requests
+                    state['bytes'] = server.bytes_sent - sent
+
+                # without parse_xbrl the XBRL is extracted to the working directory
+                cwd = os.getcwd()
+                with tempfile.TemporaryDirectory() as work:
+                    os.chdir(work)
+                    try:
+                        stats = measure(read, repeat=repeat)
+                    finally:
+                        os.chdir(cwd)
+
+                stats.update(name='reader.%s.workers%d' % ('parse' if parse_xbrl else 'fetch', max_workers),
+                             symbols=len(symbols), filings=state['filings'], requests=state['requests'],
+                             bytes=state['bytes'], latency_s=latency,
+                             filings_per_s=state['filings'] / stats['best_s'],
+                             mb_per_s=state['bytes'] / 1024 ** 2 / stats['best_s'])
+                results.append(stats)
+    return results
+
+
+def environment():
+    def version(module):
+        try:
+            return __import__(module).__version__
+        except (ImportError, AttributeError):
+            return None
+
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=_ROOT,
+                                         stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'packages': dict((m, version(m)) for m in ('xbrl', 'bs4', 'lxml', 'pandas', 'numpy', 'requests')),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Print each benchmark's best time against `baseline` (a result dict) and
+    return the names of those more than `threshold` (a fraction) slower.
+    """
+    previous = dict((r['name'], r) for r in baseline['results'])
+    regressions = []
+    for result in results:
+        before = previous.get(result['name'])
+        if before is None:
+            continue
+        ratio = result['best_s'] / before['best_s']
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(result['name'])
+            flag = '  REGRESSION'
+        print('%-40s %9.4fs -> %9.4fs  x%.2f%s' % (result['name'], before['best_s'], result['best_s'], ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Benchmark the UfoDataReader parser and reader.')
+    arg_parser.add_argument('-o', '--output', default='benchmark.json', help='result file (JSON)')
+    arg_parser.add_argument('-r', '--repeat', type=int, default=5, help='timed runs per benchmark')
+    arg_parser.add_argument('--scale', type=int, nargs='*', default=[10],
+                            help='sizes of synthetic filings, as multiples of the example')
+    arg_parser.add_argument('--recordings', default=None,
+                            help='ufocatch recording to replay (default: one generated from the example)')
+    arg_parser.add_argument('--symbols', nargs='*', default=None,
+                            help='symbols to read (default: every feed in the recording)')
+    arg_parser.add_argument('--workers', type=int, nargs='*', default=[1, 4])
+    arg_parser.add_argument('--latency', type=float, default=0.0,
+                            help='seconds added to every mock server response')
+    arg_parser.add_argument('--skip-reader', action='store_true')
+    arg_parser.add_argument('--compare', default=None, help='earlier result file to compare with')
+    arg_parser.add_argument('--threshold', type=float, default=0.2,
+                            help='slowdown (fraction of the earlier best time) counted as a regression')
+    args = arg_parser.parse_args(argv)
+
+    # python-xbrl hands the XML to an HTML parser
+    warnings.simplefilter('ignore')
+
+    with open(_EXAMPLE, 'rb') as f:
+        example = f.read()
+
+    check_example()
+
+    with tempfile.TemporaryDirectory() as work:
+        results = parser_benchmarks('example', _EXAMPLE, args.repeat)
+        for scale in args.scale:
+            path = os.path.join(work, 'x%d.xbrl' % scale)
+            with open(path, 'wb') as f:
+                f.write(make_filing(example, scale))
+            results += parser_benchmarks('x%d' % scale, path, args.repeat)
+
+        if not args.skip_reader:
+            recordings = args.recordings
+            if recordings is None:
+                recordings = os.path.join(work, 'recordings')
+                generate_recordings(recordings, example, ['%04d0' % i for i in range(1000, 1008)])
+            symbols = args.symbols or sorted(os.path.basename(p)[:-len('.xml')]
+                                             for p in glob.glob(os.path.join(recordings, 'feeds', '*.xml')))
+            results += reader_benchmarks(recordings, symbols, args.workers, args.latency, args.repeat)
+
+    report = {'environment': environment(), 'results': results}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    for result in results:
+        print('%-40s best %9.4fs  median %9.4fs  peak %8.1fMB'
+              % (result['name'], result['best_s'], result['median_s'], result['peak_mb']))
+
+    if args.compare is not None:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
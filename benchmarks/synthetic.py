@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic large XBRL filings built from a real one.
+
+Every fact of the source filing is copied `scale - 1` more times under a
+new element name, so the copies cost the parser as much as the originals
+but leave the DEI and GAAP values of the filing unchanged.
+"""
+import re
+
+# a fact: <prefix:Name ... contextRef="..." ...>value</prefix:Name>
+_FACT = re.compile(br'<(\w+:\w+)(\s[^>]*?contextRef="[^"]*"[^>]*?)(/>|>(.*?)</\1>)', re.DOTALL)
+_ID = re.compile(br'\sid="[^"]*"')
+_END = b'</xbrli:xbrl>'
+
+
+def count_facts(xbrl):
+    """
+    Return the number of facts in XBRL document `xbrl` (bytes).
+    """
+    return len(_FACT.findall(xbrl))
+
+
+def make_filing(xbrl, scale):
+    """
+    Return XBRL document `xbrl` (bytes) with about `scale` times as many facts.
+    """
+    facts = [m.group(0) for m in _FACT.finditer(xbrl)]
+
+    copies = []
+    for i in range(1, scale):
+        suffix = b'Synthetic%d' % i
+        for fact in facts:
+            name = fact[1:fact.index(b' ')]
+            fact = _ID.sub(b'', fact)
+            fact = fact.replace(b'<' + name, b'<' + name + suffix, 1)
+            if fact.endswith(b'</' + name + b'>'):
+                fact = fact[:-len(name) - 1] + name + suffix + b'>'
+            copies.append(fact)
+
+    end = xbrl.rindex(_END)
+    return xbrl[:end] + b'\n'.join(copies) + b'\n' + xbrl[end:]
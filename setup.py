@@ -9,5 +9,15 @@ setup(
     author_email='riskreturn5@gmail.com',
     url='https://github.com/sawadyrr5/UfoDataReader',
     packages=find_packages(),
-    install_requires=['python-xbrl', 'pandas', 'pandas_datareader', 'requests']
+    install_requires=['python-xbrl', 'pandas', 'pandas_datareader', 'requests'],
+    extras_require={
+        'async': ['aiohttp'],
+        'store': ['pyarrow'],
+    },
+    entry_points={
+        'console_scripts': [
+            'ufo-xbrl-batch=UfoDataReader.util.batch:main',
+            'ufo-harvest=UfoDataReader.io.harvest:main',
+        ],
+    }
 )